@@ -3,6 +3,7 @@ Event Ingestion Service
 Handles incoming events from sensor simulators
 """
 import hashlib
+from datetime import datetime, timezone
 from fastapi import HTTPException, status
 
 from app.schema.event import Event, EventCreate
@@ -16,13 +17,14 @@ async def ingest_event(event_data: EventCreate):
     Ingest a single event from sensor client
     """
     try:
-        # Generate a unique event ID (hash-based) - this will be used as document identifier
+        # Generate a unique event ID (hash-based) - this will be used as document identifier.
+        # It is also the dedup key (_id), so the scheme must stay stable across deploys
         event_id = hashlib.sha256(
             f"{event_data.household_id}_{event_data.sensor_id}_{event_data.timestamp}_{event_data.value}".encode()
         ).hexdigest()[:16]
 
-        # Create event object with event_id
-        event = Event(
+        # Create event object with event_id (fields were validated as EventCreate, so skip re-validation)
+        event = Event.from_trusted(dict(
             event_id=event_id,
             household_id=event_data.household_id,
             timestamp=event_data.timestamp,
@@ -31,18 +33,18 @@ async def ingest_event(event_data: EventCreate):
             location=event_data.location,
             value=event_data.value,
             resident=event_data.resident
-        )
+        ))
 
-        # Prepare document for MongoDB
-        event_dict = event.model_dump(by_alias=False, exclude_none=True)
+        # Prepare document for MongoDB (every field is set from EventCreate, so there are no Nones to drop)
+        event_dict = event.as_dict()
 
         # MongoDB document structure: _id = event_id (unique identifier)
         # Keep household_id as a separate field for querying
         event_dict['_id'] = event_id  # Use event_id as MongoDB _id for uniqueness
         #event_dict['household_id'] = event_data.household_id  # Explicitly preserve household_id
 
-        # Insert into MongoDB events collection
-        inserted_id = await MongoDB.write("events", event_dict)
+        # Insert into MongoDB events collection (coalesced with concurrent ingests into one insert_many)
+        inserted_id = await MongoDB.write_batched("events", event_dict)
         print(f"✓ Event inserted into MongoDB - ID: {inserted_id}, Sensor: {event.sensor_id}")
 
         """ Using kafka for real time processing to make sure:
@@ -58,6 +60,14 @@ async def ingest_event(event_data: EventCreate):
                 key=event.household_id  # Partition by household for better isolation and parallelism
             )
             print(f"✓ Event published to Kafka - Household: {event.household_id}, Sensor: {event.sensor_id}")
+
+            # Keep the compacted resident-state topic current for WebSocket initial state.
+            # "Last seen" is the UTC ingest time, the same value the live events consumer caches,
+            # so replayed and live entries in location_cache agree in meaning and format
+            if event.resident:
+                KafkaClient.publish_resident_state(
+                    event.household_id, event.resident, event.location, datetime.now(timezone.utc).isoformat()
+                )
         except Exception as kafka_error:
             # Log error but don't fail the request if Kafka is unavailable
             print(f"⚠ Failed to publish to Kafka: {kafka_error}")
@@ -72,7 +82,8 @@ async def ingest_event(event_data: EventCreate):
         except Exception as anomaly_error:
             print(f"⚠️ Anomaly detector failed for event ID {event_id}: {anomaly_error}")
 
-        return EventIngestResponse(
+        # Every field is a string we just produced, so construct without validation
+        return EventIngestResponse.model_construct(
             status="success",
             message=f"Event from household {event.household_id}, sensor {event.sensor_id} ingested successfully",
             event_id=event_id,
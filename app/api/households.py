@@ -55,13 +55,15 @@ async def list_households():
 
     for household in households:
         # Check if there are any events in last 24 hours
+        # Projecting only indexed fields lets the (household_id, timestamp) index cover this query
         recent_events = await MongoDB.read(
             "events",
             query={
                 "household_id": household["_id"],
                 "timestamp": {"$gte": cutoff_time_str}
             },
-            limit=1
+            limit=1,
+            projection={"_id": 0, "household_id": 1}
         )
 
     return households
@@ -164,7 +164,7 @@ async def search(request: SearchRequest):
                 prompt = build_analysis_prompt(request.query, search_results)
 
                 # Get LLM analysis
-                llm_response = NIMLLMService.get_custom_summary(
+                llm_response = await NIMLLMService.aget_custom_summary(
                     prompt=prompt,
                     max_tokens=250,
                     temperature=0.7
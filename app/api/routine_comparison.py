@@ -225,7 +225,7 @@ Keep it concise and actionable."""
 
         # Use the NIM LLM service
         try:
-            raw_summary = NIMLLMService.get_custom_summary(prompt, max_tokens=150, temperature=0.7)
+            raw_summary = await NIMLLMService.aget_custom_summary(prompt, max_tokens=150, temperature=0.7)
 
             # Clean up the summary formatting
             summary = clean_ai_summary(raw_summary)
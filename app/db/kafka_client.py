@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from kafka import KafkaProducer
-from kafka.errors import NoBrokersAvailable
+from kafka.admin import KafkaAdminClient, NewTopic
+from kafka.errors import NoBrokersAvailable, TopicAlreadyExistsError
 from typing import Optional, Dict, Any
 import json
 import os
@@ -15,6 +16,9 @@ class KafkaClient:
     producer: Optional[KafkaProducer] = None
     _bootstrap_servers: str = None
     _topic_events: str = None
+    _topic_resident_state: str = None
+    # Sends that failed after the producer's own retries (checked by monitoring, not raised at ingest)
+    publish_failures: int = 0
 
     @classmethod
     async def connect(cls, max_retries: int = 3, retry_delay: int = 2):
@@ -27,6 +31,7 @@ class KafkaClient:
         """
         cls._bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
         cls._topic_events = os.getenv("KAFKA_TOPIC_EVENTS", "wellnest-events")
+        cls._topic_resident_state = os.getenv("KAFKA_TOPIC_RESIDENT_STATE", "wellnest-resident-state")
 
         for attempt in range(max_retries):
             try:
@@ -40,6 +45,9 @@ class KafkaClient:
                     acks='all',  # Wait for all replicas to acknowledge
                     retries=3,
                     max_in_flight_requests_per_connection=1,
+                    # Coalesce sends into batches on the producer's background thread
+                    linger_ms=100,
+                    batch_size=64 * 1024,
                     # Connection timeout settings for local debugging
                     api_version_auto_timeout_ms=5000,  # 5 seconds to detect broker version
                     request_timeout_ms=30000,  # 30 seconds for requests
@@ -48,6 +56,12 @@ class KafkaClient:
 
                 print(f"✓ Kafka connected to {cls._bootstrap_servers}")
                 print(f"✓ Events topic: {cls._topic_events}")
+
+                try:
+                    cls._ensure_resident_state_topic()
+                    print(f"✓ Resident state topic: {cls._topic_resident_state}")
+                except Exception as e:
+                    print(f"⚠ Could not create resident state topic {cls._topic_resident_state}: {e}")
                 return
 
             except NoBrokersAvailable as e:
@@ -64,7 +78,11 @@ class KafkaClient:
     @classmethod
     def publish_event(cls, event: Dict[str, Any], key: Optional[str] = None) -> None:
         """
-        Publish an event to Kafka
+        Queue an event for publishing to Kafka
+
+        Returns as soon as the event is in the producer's buffer; the producer thread
+        sends it in a batch (linger_ms/batch_size). Delivery failures are counted in
+        publish_failures instead of being raised to the caller.
 
         Args:
             event: Event data to publish
@@ -74,20 +92,73 @@ class KafkaClient:
             raise RuntimeError("Kafka producer is not connected. Call connect() first.")
 
         try:
-            # Send message to Kafka
             future = cls.producer.send(
                 cls._topic_events,
                 key=key,
                 value=event
             )
-
-            # Wait for message to be sent (with timeout)
-            future.get(timeout=10)
+            future.add_errback(cls._on_publish_error)
 
         except Exception as e:
             print(f"✗ Failed to publish event to Kafka: {e}")
             raise
 
+    @classmethod
+    def _on_publish_error(cls, exc: Exception) -> None:
+        """Record an event that could not be delivered (runs on the producer thread)"""
+        cls.publish_failures += 1
+        print(f"✗ Failed to publish event to Kafka: {exc}")
+
+    @classmethod
+    def _ensure_resident_state_topic(cls):
+        """
+        Create the log-compacted resident-state topic if it doesn't exist yet
+
+        Compaction keeps only the latest message per household:resident key, so replaying
+        the topic from the beginning yields the current location of every resident.
+        """
+        admin = KafkaAdminClient(bootstrap_servers=cls._bootstrap_servers)
+        try:
+            admin.create_topics([NewTopic(
+                name=cls._topic_resident_state,
+                num_partitions=1,
+                replication_factor=int(os.getenv("KAFKA_REPLICATION_FACTOR", "1")),
+                topic_configs={
+                    "cleanup.policy": "compact",
+                    "min.cleanable.dirty.ratio": "0.1"
+                }
+            )])
+        except TopicAlreadyExistsError:
+            pass
+        finally:
+            admin.close()
+
+    @classmethod
+    def publish_resident_state(cls, household_id: str, resident: str, location: str, timestamp: str) -> None:
+        """
+        Publish a resident's latest location to the compacted resident-state topic
+
+        Args:
+            household_id: The household ID
+            resident: Resident name
+            location: Resident's latest location
+            timestamp: UTC ISO time the resident was last seen (ingest time)
+        """
+        if cls.producer is None:
+            raise RuntimeError("Kafka producer is not connected. Call connect() first.")
+
+        # Not awaited: a lost state update is superseded by the resident's next event
+        cls.producer.send(
+            cls._topic_resident_state,
+            key=f"{household_id}:{resident}",
+            value={
+                "household_id": household_id,
+                "resident": resident,
+                "location": location,
+                "timestamp": timestamp
+            }
+        )
+
     @classmethod
     def close(cls):
         """Close Kafka producer"""
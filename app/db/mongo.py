@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, Dict, List, Any
+from pymongo.errors import BulkWriteError, WriteError
+from typing import Optional, Dict, List, Any, Set, Tuple
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -11,6 +13,11 @@ load_dotenv()
 class MongoDB:
     client: Optional[AsyncIOMotorClient] = None
     _db_name: str = None
+    # Pending write_batched documents per collection, each with the future its caller awaits
+    _batches: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+    _flush_timers: Dict[str, asyncio.TimerHandle] = {}
+    # Running flush tasks, referenced here so they can't be garbage-collected mid-flush
+    _flush_tasks: Set[asyncio.Task] = set()
 
     @classmethod
     async def connect(cls):
@@ -55,7 +62,117 @@ class MongoDB:
         return str(result.inserted_id)
 
     @classmethod
-    async def read(cls, collection_name: str, query: Dict[str, Any] = None, limit: int = 100, sort: List[tuple] = None) -> List[Dict[str, Any]]:
+    async def write_many(cls, collection_name: str, documents: List[Dict[str, Any]]) -> List[str]:
+        """
+        Write several documents in a single insert_many round trip
+
+        Unordered, so one bad document (e.g. a duplicate _id) doesn't stop the rest; pymongo's
+        BulkWriteError is then raised with the failures in e.details["writeErrors"].
+
+        Args:
+            collection_name: Name of the collection
+            documents: Documents to insert
+
+        Returns:
+            List[str]: Inserted document IDs, in input order
+        """
+        if cls.client is None:
+            raise RuntimeError("MongoDB client is not connected. Call connect() first.")
+        if not documents:
+            return []
+
+        db = cls.client[cls._db_name]
+        collection = db[collection_name]
+        result = await collection.insert_many(documents, ordered=False)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    @classmethod
+    async def write_batched(cls, collection_name: str, document: Dict[str, Any],
+                            flush_after: int = 50, linger_ms: int = 50) -> str:
+        """
+        Write a document as part of a batched insert_many (group commit)
+
+        Concurrent callers are coalesced into one insert_many per collection, sent once
+        flush_after documents are pending or linger_ms after the first one arrived. Each
+        caller still waits for its own document to be written and sees its own error.
+
+        Args:
+            collection_name: Name of the collection
+            document: Document to insert
+            flush_after: Number of pending documents that triggers an immediate flush
+            linger_ms: Maximum time a document waits for the batch to fill
+
+        Returns:
+            str: Inserted document ID
+        """
+        if cls.client is None:
+            raise RuntimeError("MongoDB client is not connected. Call connect() first.")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = cls._batches.setdefault(collection_name, [])
+        batch.append((document, future))
+
+        if len(batch) >= flush_after:
+            cls._start_flush(collection_name)
+        elif collection_name not in cls._flush_timers:
+            cls._flush_timers[collection_name] = loop.call_later(linger_ms / 1000, cls._start_flush, collection_name)
+
+        # The flush runs in its own task; shield so cancelling this caller leaves the batch alone
+        return await asyncio.shield(future)
+
+    @classmethod
+    def _start_flush(cls, collection_name: str):
+        """Run flush(collection_name) as a task, kept in _flush_tasks until it finishes"""
+        task = asyncio.ensure_future(cls.flush(collection_name))
+        cls._flush_tasks.add(task)
+        task.add_done_callback(cls._flush_tasks.discard)
+
+    @classmethod
+    async def flush(cls, collection_name: Optional[str] = None):
+        """
+        Insert all pending write_batched documents now
+
+        Args:
+            collection_name: Collection to flush (default: all collections)
+        """
+        names = [collection_name] if collection_name else list(cls._batches)
+        for name in names:
+            timer = cls._flush_timers.pop(name, None)
+            if timer:
+                timer.cancel()
+            batch = cls._batches.pop(name, None)
+            if not batch:
+                continue
+
+            # ordered=False: one bad document (e.g. a duplicate _id) doesn't stop the rest
+            failed = {}
+            try:
+                collection = cls.client[cls._db_name][name]
+                await collection.insert_many([document for document, _ in batch], ordered=False)
+            except BulkWriteError as e:
+                failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            except BaseException as e:
+                # Fail every waiter, even if this flush was cancelled, so no caller is left pending
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+                continue
+
+            for index, (document, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if index in failed:
+                    error = failed[index]
+                    future.set_exception(WriteError(error.get("errmsg"), error.get("code"), error))
+                else:
+                    future.set_result(str(document["_id"]))
+
+    @classmethod
+    async def read(cls, collection_name: str, query: Dict[str, Any] = None, limit: int = 100, sort: List[tuple] = None,
+                   projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
         Read documents from a collection
 
@@ -64,6 +181,7 @@ class MongoDB:
             query: Query filter (default: {} - returns all documents)
             limit: Maximum number of documents to return
             sort: List of tuples (field, direction) for sorting, e.g., [("timestamp", 1)]
+            projection: Fields to return, e.g., {"_id": 0, "household_id": 1} (default: all fields)
 
         Returns:
             List[Dict]: List of documents
@@ -74,7 +192,7 @@ class MongoDB:
         query = query or {}
         db = cls.client[cls._db_name]
         collection = db[collection_name]
-        cursor = collection.find(query)
+        cursor = collection.find(query, projection) if projection else collection.find(query)
 
         # Apply sorting if provided
         if sort:
@@ -163,6 +281,27 @@ class MongoDB:
         result = await collection.update_many(query, update)
         return result.modified_count
 
+    @classmethod
+    async def upsert(cls, collection_name: str, query: Dict[str, Any], document: Dict[str, Any]) -> bool:
+        """
+        Insert or update a single document in one round-trip
+
+        Args:
+            collection_name: Name of the collection
+            query: Query filter identifying the document (e.g., {"_id": ...})
+            document: Fields to set on the matched or newly created document
+
+        Returns:
+            bool: True if a new document was inserted, False if an existing one was updated
+        """
+        if cls.client is None:
+            raise RuntimeError("MongoDB client is not connected. Call connect() first.")
+
+        db = cls.client[cls._db_name]
+        collection = db[collection_name]
+        result = await collection.update_one(query, {"$set": document}, upsert=True)
+        return result.upserted_id is not None
+
     @classmethod
     async def count(cls, collection_name: str, query: Dict[str, Any] = None) -> int:
         """
@@ -184,9 +323,45 @@ class MongoDB:
         count = await collection.count_documents(query)
         return count
 
+    @classmethod
+    async def create_index(cls, collection_name: str, keys: List[tuple], **kwargs) -> str:
+        """
+        Create an index on a collection (no-op if an identical index already exists)
+
+        Args:
+            collection_name: Name of the collection
+            keys: List of tuples (field, direction), e.g., [("household_id", 1), ("timestamp", -1)]
+            **kwargs: Extra index options passed to create_index (e.g., name, expireAfterSeconds)
+
+        Returns:
+            str: Name of the index
+        """
+        if cls.client is None:
+            raise RuntimeError("MongoDB client is not connected. Call connect() first.")
+
+        db = cls.client[cls._db_name]
+        collection = db[collection_name]
+        return await collection.create_index(keys, **kwargs)
+
+    @classmethod
+    async def ensure_indexes(cls):
+        """
+        Create the compound indexes backing the per-household, newest-first reads
+
+        Events and alerts are always filtered by household_id and sorted or ranged on
+        timestamp, so (household_id, timestamp desc) lets MongoDB walk the index instead
+        of scanning the collection and sorting in memory.
+        """
+        for collection_name in ("events", "alerts"):
+            await cls.create_index(collection_name, [("household_id", 1), ("timestamp", -1)])
+        print("✓ MongoDB indexes ensured")
+
     @classmethod
     async def close(cls):
-        """Close MongoDB connection"""
+        """Close MongoDB connection, writing any pending batched documents first"""
         if cls.client:
+            await cls.flush()
+            if cls._flush_tasks:
+                await asyncio.gather(*cls._flush_tasks, return_exceptions=True)
             cls.client.close()
             print("✓ MongoDB connection closed")
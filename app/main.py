@@ -5,8 +5,10 @@ from app.db.mongo import MongoDB
 from app.db.kafka_client import KafkaClient
 from app.db.qdrant_client import QdrantClient
 from app.services.nim_embedding_service import NIMEmbeddingService
+from app.services.nim_llm_service import close_http as close_nim_http
 from app.scheduler import start_scheduler, shutdown_scheduler
 from app.services.events_consumer import start_events_consumer
+from app.services.ws_manager import manager
 import threading
 import asyncio
 # from app.db.redis_client import RedisClient
@@ -122,6 +124,12 @@ async def startup_event():
         print(f"✗ Error connecting to MongoDB: {e}")
         raise
 
+    # Create indexes for hot queries (idempotent; failures are non-fatal)
+    try:
+        await MongoDB.ensure_indexes()
+    except Exception as e:
+        print(f"⚠ Could not create MongoDB indexes: {e}")
+
     # Initialize Kafka
     try:
         await KafkaClient.connect()
@@ -162,6 +170,12 @@ async def startup_event():
     except Exception as e:
         print(f"⚠ Error starting routine learner scheduler: {e}")
 
+    # Bootstrap resident locations from the compacted state topic for WebSocket initial state
+    try:
+        asyncio.create_task(manager.load_resident_state())
+    except Exception as e:
+        print(f"⚠ Error loading resident state: {e}")
+
     # Start the events consumer for WebSocket streaming
     try:
         asyncio.create_task(start_events_consumer())
@@ -226,6 +240,12 @@ async def shutdown_event():
     except Exception as e:
         print(f"✗ Error closing Qdrant: {e}")
 
+    # Close the async NIM LLM client
+    try:
+        await close_nim_http()
+    except Exception as e:
+        print(f"✗ Error closing NIM LLM client: {e}")
+
     # Close other databases when needed
     # try:
     #     # Close Redis
@@ -2,8 +2,10 @@ from app.db.mongo import MongoDB
 from app.db.qdrant_client import QdrantClient
 from app.services.nim_embedding_service import NIMEmbeddingService
 from app.services.nim_llm_service import NIMLLMService
+from app.services.anomaly_detector import detector
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import operator
 import statistics
 import uuid
 
@@ -16,51 +18,60 @@ def get_yesterday_range():
     yesterday = today - timedelta(days=1)
     return yesterday, today
 
+# Sensor values are stored as strings ("True"/"False"); older events may hold real booleans
+TRUE_VALUES = frozenset(["True", "true", True])
+FALSE_VALUES = frozenset(["False", "false", False])
+
+_by_timestamp = operator.itemgetter("timestamp")
+
+
 def extract_routine(events):
     wake_up_time, bed_time, first_kitchen = None, None, None
     bathroom_first, bathroom_count = None, 0
     first_bedroom_motion, last_bedroom_motion = None, None
     activity_start, activity_end = None, None
 
-    events_sorted = sorted(events, key=lambda x: x["timestamp"])
+    events_sorted = sorted(events, key=_by_timestamp)
+
+    # Overall activity window is just the first and last event
+    if events_sorted:
+        activity_start = events_sorted[0]["timestamp"][11:16]  # 'YYYY-MM-DDTHH:MM:SS' -> extract HH:MM
+        activity_end = events_sorted[-1]["timestamp"][11:16]
 
+    # One pass, one branch per event; only matching events pay for the HH:MM slice
     for event in events_sorted:
-        ts = event["timestamp"][11:16]  # 'YYYY-MM-DDTHH:MM:SS' -> extract HH:MM
         stype = event["sensor_type"]
-        loc = event["location"]
-        val = event["value"]
 
-        # Track overall activity window
-        if activity_start is None:
-            activity_start = ts
-        activity_end = ts
+        if stype == "motion":
+            if event["value"] not in TRUE_VALUES:
+                continue
+            loc = event["location"]
+            ts = event["timestamp"][11:16]
 
-        # Bed presence: value is stored as string "True"/"False"
-        if stype == "bed_presence":
-            if val in ["False", "false", False] and not wake_up_time:
-                wake_up_time = ts
-            if val in ["True", "true", True]:
-                bed_time = ts  # will be overwritten until last
-
-        # Kitchen activity
-        if stype == "motion" and loc == "kitchen":
-            if val in ["True", "true", True] and not first_kitchen:
+            # Kitchen activity
+            if loc == "kitchen" and not first_kitchen:
                 first_kitchen = ts
 
-        # Bathroom activity
-        if stype == "motion" and "bathroom" in loc:
-            if val in ["True", "true", True]:
+            # Bathroom activity
+            if "bathroom" in loc:
                 if not bathroom_first:
                     bathroom_first = ts
                 bathroom_count += 1
 
-        # Bedroom motion (backup for wake/sleep detection if bed sensor missing)
-        if stype == "motion" and "bedroom" in loc:
-            if val in ["True", "true", True]:
+            # Bedroom motion (backup for wake/sleep detection if bed sensor missing)
+            if "bedroom" in loc:
                 if not first_bedroom_motion:
                     first_bedroom_motion = ts
                 last_bedroom_motion = ts
 
+        # Bed presence: value is stored as string "True"/"False"
+        elif stype == "bed_presence":
+            val = event["value"]
+            if val in FALSE_VALUES and not wake_up_time:
+                wake_up_time = event["timestamp"][11:16]
+            elif val in TRUE_VALUES:
+                bed_time = event["timestamp"][11:16]  # will be overwritten until last
+
     # Use bedroom motion as fallback for wake/bed times
     if not wake_up_time and first_bedroom_motion:
         wake_up_time = first_bedroom_motion
@@ -79,14 +90,14 @@ def extract_routine(events):
         "total_events": len(events)
     }
 
-def generate_summary(profile_dict):
+async def generate_summary(profile_dict):
     """
     Generate a human-readable summary of the routine using NIM LLM.
     Falls back to template-based summary if LLM call fails.
     """
-    # Try to use NIM LLM for better summaries
+    # Try to use NIM LLM for better summaries (async client, so the event loop isn't blocked)
     try:
-        llm_summary = NIMLLMService.get_llama3_summary(profile_dict)
+        llm_summary = await NIMLLMService.aget_llama3_summary(profile_dict)
         return llm_summary
     except Exception as e:
         print(f"⚠ Failed to generate LLM summary, falling back to template: {e}")
@@ -118,7 +129,7 @@ def generate_summary(profile_dict):
 async def save_profile(household_id, profile_dict, summary_text=""):
     # Generate summary if not provided
     if not summary_text:
-        summary_text = generate_summary(profile_dict)
+        summary_text = await generate_summary(profile_dict)
 
     date = datetime.now().strftime("%Y-%m-%d")
 
@@ -128,7 +139,8 @@ async def save_profile(household_id, profile_dict, summary_text=""):
         "date": date,
         "summary_text": summary_text
     })
-    await MongoDB.write("daily_routines", profile_dict)
+    # Upsert so re-running the learner on the same day overwrites instead of hitting a duplicate key
+    await MongoDB.upsert("daily_routines", {"_id": profile_dict["_id"]}, profile_dict)
     print(f"Saved routine profile for {household_id}: {summary_text}")
 
 async def batch_routine_learner_daily():
@@ -290,7 +302,8 @@ async def aggregate_baselines(n_days=7, baseline_collection="routine_baselines",
             }
         }
 
-        await MongoDB.write(baseline_collection, baseline_doc)
+        await MongoDB.upsert(baseline_collection, {"_id": baseline_doc["_id"]}, baseline_doc)
+        detector.invalidate_baseline(h_id)
         print(f"✓ Saved baseline profile for {h_id} covering {start_str} to {end_str}")
 
         # Generate embedding for the baseline routine
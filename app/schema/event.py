@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
 
 class Event(BaseModel):
     """Model for sensor events - all fields are strings"""
@@ -15,6 +15,15 @@ class Event(BaseModel):
     class Config:
         populate_by_name = True
 
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]):
+        """Build from already-validated data without re-running validation (model_construct)"""
+        return cls.model_construct(**data)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Shallow dict of field values; fields are flat strings, so this matches model_dump() without its traversal"""
+        return dict(self.__dict__)
+
 class EventCreate(BaseModel):
     """Model for creating a new event from sensor client"""
     household_id: str
@@ -25,6 +34,11 @@ class EventCreate(BaseModel):
     value: str
     resident: str
 
+    class Config:
+        # Immutable once validated, so one instance can be shared safely (e.g. across handlers and tests)
+        frozen = True
+        extra = "ignore"
+
 class EventResponse(Event):
     """Model for event API responses"""
     pass
@@ -1,26 +1,51 @@
 # app/services/anomaly_detector.py
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from asyncio import Lock
+from typing import Dict, Optional
 from app.db.mongo import MongoDB
 from app.services.ws_manager import manager
 
+@dataclass(slots=True)
+class HouseholdState:
+    """Today's activity state for one household, built up from its events"""
+    wake_detected: bool = False
+    kitchen_visited: bool = False
+    bathroom_count: int = 0
+    last_motion_time: Optional[str] = None
+    last_location: Optional[str] = None
+    door_opened: bool = False
+    first_kitchen_time: Optional[str] = None
+    wake_up_time: Optional[str] = None
+
+
 class AnomalyDetector:
     CRITICAL_EVENTS = {"door", "sos_button"}
     SCHEDULED_CHECKS = ["09:00", "11:00", "14:00", "22:00"]  # ["HH:MM"]
     ALERT_COOLDOWN_HOURS = 2  # Don't send same alert type within 2 hours
+    BASELINE_CACHE_TTL_SECONDS = 3600  # Baselines are recomputed daily; re-read at most hourly
+    BASELINE_CACHE_MAXSIZE = 10_000  # Households kept in baseline_cache (oldest evicted first)
+    ALERT_TITLES = {
+        "missed_kitchen_activity": "⚠️ Missed Breakfast Activity",
+        "prolonged_inactivity": "🚨 No Movement Detected",
+        "excessive_bathroom_visits": "💊 Frequent Bathroom Visits",
+        "late_wake_up": "😴 Later Wake-Up Than Usual",
+        "unusual_door_activity": "🚪 Door Activity at Unusual Hour"
+    }
 
     def __init__(self):
         self.baseline_cache = {}
-        self.household_state = {}
+        self.household_state: Dict[str, HouseholdState] = {}
         self.last_check_time = {}
         self.recent_alerts = {}  # {household_id: {alert_type: timestamp}}
         self.state_locks = {}  # household_id -> Lock for thread-safe state updates
 
     async def get_baseline(self, household_id: str):
-        if household_id in self.baseline_cache:
-            cached = self.baseline_cache[household_id]
-            if (datetime.now(timezone.utc) - cached['cached_at']).total_seconds() < 86400:
+        cached = self.baseline_cache.get(household_id)
+        if cached is not None:
+            if (datetime.now(timezone.utc) - cached['cached_at']).total_seconds() < self.BASELINE_CACHE_TTL_SECONDS:
                 return cached['baseline']
+            del self.baseline_cache[household_id]
         query = {
             "household_id": household_id,
             "baseline_type": "rolling7"
@@ -31,14 +56,20 @@ class AnomalyDetector:
             sort=[("computed_at", -1)],
             limit=1
         )
-        if baselines:
-            baseline = baselines[0]
-            self.baseline_cache[household_id] = {
-                'baseline': baseline,
-                'cached_at': datetime.now(timezone.utc)
-            }
-            return baseline
-        return None
+        # Cache misses too, so households without a baseline don't hit MongoDB on every check
+        baseline = baselines[0] if baselines else None
+        if len(self.baseline_cache) >= self.BASELINE_CACHE_MAXSIZE:
+            # Dicts keep insertion order and entries are re-inserted on refresh: first is oldest
+            del self.baseline_cache[next(iter(self.baseline_cache))]
+        self.baseline_cache[household_id] = {
+            'baseline': baseline,
+            'cached_at': datetime.now(timezone.utc)
+        }
+        return baseline
+
+    def invalidate_baseline(self, household_id: str):
+        """Drop a household's cached baseline so the next check reads the freshly computed one"""
+        self.baseline_cache.pop(household_id, None)
 
     def time_to_minutes(self, time_str: str):
         try:
@@ -88,16 +119,7 @@ class AnomalyDetector:
             }
             # Remove arbitrary limit - get ALL today's events, sorted by timestamp
             events = await MongoDB.read("events", query=query, sort=[("timestamp", 1)])
-            state = {
-                "wake_detected": False,
-                "kitchen_visited": False,
-                "bathroom_count": 0,
-                "last_motion_time": None,
-                "last_location": None,
-                "door_opened": False,
-                "first_kitchen_time": None,
-                "wake_up_time": None
-            }
+            state = HouseholdState()
             # Events are already sorted by timestamp from MongoDB
             for event in events:
                 self._update_state(state, event)
@@ -110,20 +132,20 @@ class AnomalyDetector:
         val = event["value"]
         ts = event["timestamp"]
         if stype == "bed_presence" and val in ["False", "false", False]:
-            if not state["wake_detected"]:
-                state["wake_detected"] = True
-                state["wake_up_time"] = ts[11:16]
+            if not state.wake_detected:
+                state.wake_detected = True
+                state.wake_up_time = ts[11:16]
         if stype == "motion" and loc == "kitchen" and val in ["True", "true", True]:
-            if not state["kitchen_visited"]:
-                state["kitchen_visited"] = True
-                state["first_kitchen_time"] = ts[11:16]
+            if not state.kitchen_visited:
+                state.kitchen_visited = True
+                state.first_kitchen_time = ts[11:16]
         if stype == "motion" and "bathroom" in loc and val in ["True", "true", True]:
-            state["bathroom_count"] += 1
+            state.bathroom_count += 1
         if stype == "motion" and val in ["True", "true", True]:
-            state["last_motion_time"] = ts
-            state["last_location"] = loc
+            state.last_motion_time = ts
+            state.last_location = loc
         if stype == "door" and loc == "entrance":
-            state["door_opened"] = True
+            state.door_opened = True
 
     async def check_and_reset_daily_cache(self, household_id: str):
         """Reset state cache if we've crossed midnight"""
@@ -174,7 +196,7 @@ class AnomalyDetector:
         current_minutes = current_time.hour * 60 + current_time.minute
         # ---- SAME ANOMALY RULES AS BEFORE ----
         # Missed kitchen visit
-        if state["wake_detected"] and not state["kitchen_visited"]:
+        if state.wake_detected and not state.kitchen_visited:
             kitchen_baseline = baseline.get("first_kitchen_time", {})
             if kitchen_baseline.get("latest"):
                 latest_kitchen_mins = self.time_to_minutes(kitchen_baseline["latest"])
@@ -183,14 +205,14 @@ class AnomalyDetector:
                         "type": "missed_kitchen_activity",
                         "severity": "medium",
                         "message": f"No kitchen activity detected. Expected by {kitchen_baseline['median']}.",
-                        "context": f"Last seen in {state['last_location']}" if state['last_location'] else "Location unknown",
+                        "context": f"Last seen in {state.last_location}" if state.last_location else "Location unknown",
                         "household_id": household_id,
                         "timestamp": current_time.isoformat(),
                         "actionable": "Check on resident or call to confirm well-being"
                     })
         # Prolonged inactivity
-        if state["last_motion_time"]:
-            last_motion = datetime.fromisoformat(state["last_motion_time"])
+        if state.last_motion_time:
+            last_motion = datetime.fromisoformat(state.last_motion_time)
             # Make last_motion timezone-aware if it's naive
             if last_motion.tzinfo is None:
                 last_motion = last_motion.replace(tzinfo=timezone.utc)
@@ -200,7 +222,7 @@ class AnomalyDetector:
                     "type": "prolonged_inactivity",
                     "severity": "high",
                     "message": f"No motion detected for {inactivity_hours:.1f} hours",
-                    "context": f"Last activity in {state['last_location']} at {state['last_motion_time'][11:16]}",
+                    "context": f"Last activity in {state.last_location} at {state.last_motion_time[11:16]}",
                     "household_id": household_id,
                     "timestamp": current_time.isoformat()
                 })
@@ -210,26 +232,26 @@ class AnomalyDetector:
         bathroom_baseline = baseline.get("bathroom_visits", {})
         if bathroom_baseline.get("max_daily"):
             threshold = bathroom_baseline["max_daily"] + 2
-            if state["bathroom_count"] > threshold:
+            if state.bathroom_count > threshold:
                 anomalies.append({
                     "type": "excessive_bathroom_visits",
                     "severity": "medium",
-                    "message": f"{state['bathroom_count']} bathroom visits (typical: {bathroom_baseline.get('daily_median', 'unknown')})",
+                    "message": f"{state.bathroom_count} bathroom visits (typical: {bathroom_baseline.get('daily_median', 'unknown')})",
                     "context": "May indicate health concern",
                     "household_id": household_id,
                     "timestamp": current_time.isoformat()
                 })
         # Late wake up
-        if state["wake_detected"] and state["wake_up_time"]:
+        if state.wake_detected and state.wake_up_time:
             wake_baseline = baseline.get("wake_up_time", {})
             if wake_baseline.get("latest"):
                 latest_wake_mins = self.time_to_minutes(wake_baseline["latest"])
-                actual_wake_mins = self.time_to_minutes(state["wake_up_time"])
+                actual_wake_mins = self.time_to_minutes(state.wake_up_time)
                 if actual_wake_mins and latest_wake_mins and actual_wake_mins > latest_wake_mins + 60:
                     anomalies.append({
                         "type": "late_wake_up",
                         "severity": "low",
-                        "message": f"Woke up at {state['wake_up_time']} (typical: {wake_baseline.get('median', 'unknown')})",
+                        "message": f"Woke up at {state.wake_up_time} (typical: {wake_baseline.get('median', 'unknown')})",
                         "context": "Later than usual",
                         "household_id": household_id,
                         "timestamp": current_time.isoformat()
@@ -288,14 +310,7 @@ class AnomalyDetector:
         print(f"📲 Pushed alert to frontend: {anomaly['type']} for {household_id}")
 
     def _get_alert_title(self, alert_type: str):
-        titles = {
-            "missed_kitchen_activity": "⚠️ Missed Breakfast Activity",
-            "prolonged_inactivity": "🚨 No Movement Detected",
-            "excessive_bathroom_visits": "💊 Frequent Bathroom Visits",
-            "late_wake_up": "😴 Later Wake-Up Than Usual",
-            "unusual_door_activity": "🚪 Door Activity at Unusual Hour"
-        }
-        return titles.get(alert_type, "🔔 Wellness Alert")
+        return self.ALERT_TITLES.get(alert_type, "🔔 Wellness Alert")
 
     def reset_daily_state(self):
         self.household_state = {}
@@ -5,10 +5,10 @@ Consumes events from wellnest-events topic and forwards to connected WebSocket c
 import asyncio
 import json
 import os
-from kafka import KafkaConsumer
-from kafka.errors import NoBrokersAvailable
+from aiokafka import AIOKafkaConsumer
+from aiokafka.errors import KafkaConnectionError
 from app.services.ws_manager import manager
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 class EventsConsumer:
@@ -25,22 +25,23 @@ class EventsConsumer:
 
         while self.running:
             try:
-                # Create Kafka consumer
-                self.consumer = KafkaConsumer(
+                # Create Kafka consumer (asyncio-native, so polling never blocks the event loop)
+                self.consumer = AIOKafkaConsumer(
                     self.topic,
                     bootstrap_servers=self.bootstrap_servers,
                     auto_offset_reset='latest',  # Only get new messages
                     enable_auto_commit=True,
                     group_id='websocket-events-group',
-                    value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-                    consumer_timeout_ms=1000  # Timeout to allow checking self.running
+                    value_deserializer=lambda x: json.loads(x.decode('utf-8'))
                 )
+                await self.consumer.start()
 
                 print(f"✓ Events Consumer connected to Kafka at {self.bootstrap_servers}")
 
                 # Consume messages
                 while self.running:
-                    messages = self.consumer.poll(timeout_ms=1000)
+                    # Timeout lets the loop re-check self.running
+                    messages = await self.consumer.getmany(timeout_ms=1000)
 
                     for topic_partition, records in messages.items():
                         for record in records:
@@ -51,16 +52,18 @@ class EventsConsumer:
                                 household_id = event.get("household_id")
 
                                 if household_id:
+                                    # Format the timestamp once and reuse it for the cache and the event
+                                    now_iso = datetime.now(timezone.utc).isoformat()
+
                                     # Update cache with resident's latest location
                                     resident = event.get("resident")
                                     location = event.get("location")
 
                                     if resident and location:
-                                        await manager.update_resident_location(household_id, resident, location)
+                                        await manager.update_resident_location(household_id, resident, location, now_iso)
 
                                     # Add timestamp to event before forwarding
-                                    from datetime import datetime
-                                    event["last_active"] = datetime.utcnow().isoformat()
+                                    event["last_active"] = now_iso
 
                                     # Forward entire event to WebSocket clients for this household
                                     await manager.send_alert(household_id, event)
@@ -73,10 +76,7 @@ class EventsConsumer:
                             except Exception as e:
                                 print(f"❌ Error processing event: {e}")
 
-                    # Small delay to prevent CPU spinning
-                    await asyncio.sleep(0.1)
-
-            except NoBrokersAvailable:
+            except KafkaConnectionError:
                 print(f"⚠ Kafka not available, retrying in 5 seconds...")
                 await asyncio.sleep(5)
             except Exception as e:
@@ -84,14 +84,15 @@ class EventsConsumer:
                 await asyncio.sleep(5)
             finally:
                 if self.consumer:
-                    self.consumer.close()
+                    await self.consumer.stop()
+                    self.consumer = None
                     print("✓ Events Consumer closed")
 
     async def stop(self):
         """Stop the consumer"""
         self.running = False
         if self.consumer:
-            self.consumer.close()
+            await self.consumer.stop()
         print("✓ Events Consumer stopped")
 
 
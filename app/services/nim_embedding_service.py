@@ -7,6 +7,67 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Texts per embeddings request; NVIDIAEmbeddings.embed_documents splits larger inputs into batches of this size
+EMBED_BATCH_SIZE = 50
+
+_BASELINE_HEADER = "Household {} baseline summary for {} days from {} to {}".format
+
+
+def _any_set(values):
+    return any(v != "N/A" for v in values)
+
+
+def _first_set(values):
+    return values[0] != "N/A"
+
+
+# (template, nested field paths, whether to include the sentence) in output order
+_BASELINE_SECTIONS = (
+    ("Wake-up time: {}, bed time: {}".format,
+     (('wake_up_time', 'median'), ('bed_time', 'median')), _any_set),
+    ("First kitchen visit: {}, first bathroom visit: {}".format,
+     (('first_kitchen_time', 'median'), ('bathroom_first_time', 'median')), _any_set),
+    ("Bathroom visits - avg: {}, median: {}, range: {}-{}".format,
+     (('bathroom_visits', 'daily_avg'), ('bathroom_visits', 'daily_median'),
+      ('bathroom_visits', 'min_daily'), ('bathroom_visits', 'max_daily')), _first_set),
+    ("Activity duration: {} minutes, earliest start: {}, latest end: {}".format,
+     (('activity_duration', 'median_minutes'), ('activity_duration', 'earliest_start'),
+      ('activity_duration', 'latest_end')), _first_set),
+    ("Daily events - avg: {}, median: {}, range: {}-{}".format,
+     (('total_daily_events', 'avg'), ('total_daily_events', 'median'),
+      ('total_daily_events', 'min'), ('total_daily_events', 'max')), _first_set),
+    ("Data quality: {} complete days, {} missing wake, {} missing kitchen, reliability: {}".format,
+     (('data_quality', 'days_with_complete_data'), ('data_quality', 'days_with_missing_wake'),
+      ('data_quality', 'days_with_missing_kitchen'), ('data_quality', 'reliability_score')), _first_set),
+)
+
+
+def _safe_get(data, *keys, default="N/A"):
+    """Safely get a nested value, returning default for missing or empty entries"""
+    for key in keys:
+        if isinstance(data, dict):
+            data = data.get(key, {})
+        else:
+            return default
+    return data if data != {} else default
+
+
+def _format_baseline(b: Dict[str, Any]) -> str:
+    """Build the embedding text for a baseline"""
+    text_parts = [_BASELINE_HEADER(
+        b.get('household_id', 'unknown'),
+        _safe_get(b, 'baseline_period', 'days', default=0),
+        _safe_get(b, 'baseline_period', 'start_date'),
+        _safe_get(b, 'baseline_period', 'end_date'),
+    )]
+
+    for template, paths, include in _BASELINE_SECTIONS:
+        values = [_safe_get(b, *path) for path in paths]
+        if include(values):
+            text_parts.append(template(*values))
+
+    return ". ".join(text_parts) + "."
+
 
 class NIMEmbeddingService:
     """NVIDIA NIM Embedding Service for generating text embeddings"""
@@ -29,6 +90,7 @@ class NIMEmbeddingService:
                 model=cls._model_name,
                 api_key=cls._api_key,
                 truncate="NONE",
+                max_batch_size=EMBED_BATCH_SIZE,
             )
             print(f"✓ NIM Embedding Service initialized with model: {cls._model_name}")
         except Exception as e:
@@ -54,16 +116,18 @@ class NIMEmbeddingService:
     @classmethod
     def embed_documents(cls, texts: List[str]) -> List[List[float]]:
         """
-        Generate embeddings for multiple documents
+        Generate embeddings for multiple documents (the client batches requests by EMBED_BATCH_SIZE)
 
         Args:
             texts: List of input texts to embed
 
         Returns:
-            List[List[float]]: List of embedding vectors
+            List[List[float]]: List of embedding vectors, in the same order as texts
         """
         if cls.client is None:
             raise RuntimeError("NIM client is not initialized. Call initialize() first.")
+        if not texts:
+            return []
 
         return cls.client.embed_documents(texts)
 
@@ -78,71 +142,7 @@ class NIMEmbeddingService:
         Returns:
             str: Formatted text representation of the baseline
         """
-        b = baseline
-
-        # Helper to safely get nested values
-        def safe_get(data, *keys, default="N/A"):
-            for key in keys:
-                if isinstance(data, dict):
-                    data = data.get(key, {})
-                else:
-                    return default
-            return data if data != {} else default
-
-        # Build the text representation with safe field access
-        text_parts = []
-
-        # Household and period info
-        household_id = b.get('household_id', 'unknown')
-        days = safe_get(b, 'baseline_period', 'days', default=0)
-        start_date = safe_get(b, 'baseline_period', 'start_date')
-        end_date = safe_get(b, 'baseline_period', 'end_date')
-        text_parts.append(f"Household {household_id} baseline summary for {days} days from {start_date} to {end_date}")
-
-        # Wake and bed times
-        wake_median = safe_get(b, 'wake_up_time', 'median')
-        bed_median = safe_get(b, 'bed_time', 'median')
-        if wake_median != "N/A" or bed_median != "N/A":
-            text_parts.append(f"Wake-up time: {wake_median}, bed time: {bed_median}")
-
-        # Kitchen and bathroom times
-        kitchen_median = safe_get(b, 'first_kitchen_time', 'median')
-        bathroom_median = safe_get(b, 'bathroom_first_time', 'median')
-        if kitchen_median != "N/A" or bathroom_median != "N/A":
-            text_parts.append(f"First kitchen visit: {kitchen_median}, first bathroom visit: {bathroom_median}")
-
-        # Bathroom visits
-        bath_avg = safe_get(b, 'bathroom_visits', 'daily_avg')
-        bath_median = safe_get(b, 'bathroom_visits', 'daily_median')
-        bath_min = safe_get(b, 'bathroom_visits', 'min_daily')
-        bath_max = safe_get(b, 'bathroom_visits', 'max_daily')
-        if bath_avg != "N/A":
-            text_parts.append(f"Bathroom visits - avg: {bath_avg}, median: {bath_median}, range: {bath_min}-{bath_max}")
-
-        # Activity duration
-        activity_median = safe_get(b, 'activity_duration', 'median_minutes')
-        activity_earliest = safe_get(b, 'activity_duration', 'earliest_start')
-        activity_latest = safe_get(b, 'activity_duration', 'latest_end')
-        if activity_median != "N/A":
-            text_parts.append(f"Activity duration: {activity_median} minutes, earliest start: {activity_earliest}, latest end: {activity_latest}")
-
-        # Daily events
-        events_avg = safe_get(b, 'total_daily_events', 'avg')
-        events_median = safe_get(b, 'total_daily_events', 'median')
-        events_min = safe_get(b, 'total_daily_events', 'min')
-        events_max = safe_get(b, 'total_daily_events', 'max')
-        if events_avg != "N/A":
-            text_parts.append(f"Daily events - avg: {events_avg}, median: {events_median}, range: {events_min}-{events_max}")
-
-        # Data quality
-        complete_days = safe_get(b, 'data_quality', 'days_with_complete_data')
-        missing_wake = safe_get(b, 'data_quality', 'days_with_missing_wake')
-        missing_kitchen = safe_get(b, 'data_quality', 'days_with_missing_kitchen')
-        reliability = safe_get(b, 'data_quality', 'reliability_score')
-        if complete_days != "N/A":
-            text_parts.append(f"Data quality: {complete_days} complete days, {missing_wake} missing wake, {missing_kitchen} missing kitchen, reliability: {reliability}")
-
-        return ". ".join(text_parts) + "."
+        return _format_baseline(baseline)
 
     @classmethod
     def format_daily_routine_for_embedding(cls, routine: Dict[str, Any]) -> str:
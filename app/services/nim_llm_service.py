@@ -1,6 +1,206 @@
+import httpx
 import requests
+import asyncio
 import os
-from typing import Dict, Any
+import importlib.util
+import orjson
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from urllib3.util.retry import Retry
+
+
+# Transient statuses retried with exponential backoff and jitter (NIM answers 429 under burst load)
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 0.3
+RETRY_MAX_BACKOFF_SECONDS = 10.0
+
+# Backoff sleep used by _apost_with_retry (module alias so tests can patch it without touching asyncio)
+_sleep = asyncio.sleep
+
+
+def _create_session() -> requests.Session:
+    """Create the shared HTTP session: keep-alive connections to NIM are reused across calls"""
+    session = requests.Session()
+    # Only connection failures are retried here; retryable statuses are handled by _post_with_retry,
+    # which the async client shares
+    retries = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.2)
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries))
+    return session
+
+
+def _retry_delay(attempt: int, response) -> float:
+    """Seconds to wait before retry number attempt + 1: Retry-After if given, else jittered backoff"""
+    retry_after = response.headers.get("Retry-After") if response.headers else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+    # "Full jitter": spread retries from concurrent callers instead of retrying in lockstep
+    return random.uniform(0, min(RETRY_MAX_BACKOFF_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def _post_with_retry(url: str, **kwargs) -> requests.Response:
+    """
+    POST via the shared session, retrying RETRY_STATUSES; the final response is returned as-is
+
+    Backs off with time.sleep, so it must not be called from the event loop; async code uses
+    _apost_with_retry.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        response = _SESSION.post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        delay = _retry_delay(attempt, response)
+        print(f"⚠ NIM LLM API returned {response.status_code}, retrying in {delay:.2f}s")
+        response.close()
+        time.sleep(delay)
+
+
+async def _apost_with_retry(url: str, **kwargs) -> httpx.Response:
+    """Async counterpart of _post_with_retry over the shared httpx client"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = await _get_async_client().post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        delay = _retry_delay(attempt, response)
+        print(f"⚠ NIM LLM API returned {response.status_code}, retrying in {delay:.2f}s")
+        await response.aclose()
+        await _sleep(delay)
+
+
+# Module-level session so every summary call skips the TCP+TLS handshake
+_SESSION = _create_session()
+
+# Default number of summary requests in flight at once for batch calls (kept below pool_maxsize)
+SUMMARY_MAX_CONCURRENCY = 8
+
+# Max routine summaries kept in memory (least recently used evicted first)
+SUMMARY_CACHE_SIZE = 512
+_SUMMARY_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_SUMMARY_CACHE_LOCK = threading.Lock()  # Batch summaries touch the cache from worker threads
+
+
+# Ask for compressed responses; brotli only when a decoder is installed (requests and httpx use it if present)
+ACCEPT_ENCODING = ("gzip, br" if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+                   else "gzip")
+
+# (api_key, headers) for the last key seen; rebuilt only when NIM_API_KEY changes
+_AUTH_HEADERS_CACHE: Optional[Tuple[str, Dict[str, str]]] = None
+
+
+def _get_auth_headers() -> Dict[str, str]:
+    """Return the request headers for the current NIM_API_KEY (shared dict; don't mutate)"""
+    global _AUTH_HEADERS_CACHE
+
+    api_key = os.getenv("NIM_API_KEY")
+    if not api_key:
+        raise KeyError("NIM_API_KEY not found in environment variables")
+
+    cached = _AUTH_HEADERS_CACHE
+    if cached is None or cached[0] != api_key:
+        cached = _AUTH_HEADERS_CACHE = (api_key, {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING
+        })
+    return cached[1]
+
+
+# Connection limits for the async client, so thousands of summaries can be in flight from
+# async handlers without tying up threads (see configure_http)
+HTTP_MAX_CONNECTIONS = 2000
+HTTP_MAX_KEEPALIVE = 1500
+_HTTP_LIMITS = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Return the shared async client, creating it on first use"""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=30.0, http2=True)
+    return _ASYNC_CLIENT
+
+
+async def configure_http(max_connections: int = HTTP_MAX_CONNECTIONS,
+                         max_keepalive: int = HTTP_MAX_KEEPALIVE):
+    """
+    Set the async client's connection limits; the client is rebuilt on next use
+
+    Args:
+        max_connections: Maximum concurrent connections to the NIM endpoint
+        max_keepalive: Maximum idle connections kept open for reuse
+    """
+    global _HTTP_LIMITS
+    _HTTP_LIMITS = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+    await close_http()
+
+
+async def close_http():
+    """Close the shared async client, if one was created"""
+    global _ASYNC_CLIENT
+    client, _ASYNC_CLIENT = _ASYNC_CLIENT, None
+    if client is not None:
+        await client.aclose()
+
+
+def _cached_summary(key: str) -> Optional[str]:
+    with _SUMMARY_CACHE_LOCK:
+        summary = _SUMMARY_CACHE.get(key)
+        if summary is not None:
+            _SUMMARY_CACHE.move_to_end(key)
+        return summary
+
+
+def _cache_summary(key: str, summary: str):
+    with _SUMMARY_CACHE_LOCK:
+        _SUMMARY_CACHE[key] = summary
+        _SUMMARY_CACHE.move_to_end(key)
+        if len(_SUMMARY_CACHE) > SUMMARY_CACHE_SIZE:
+            _SUMMARY_CACHE.popitem(last=False)
+
+
+def _has_activity(routine: Dict[str, Any]) -> bool:
+    """
+    True if any field of the routine carries a value worth summarizing
+
+    Zero counts don't count: extract_routine([]) yields total_events=0 and total_bathroom_events=0.
+    """
+    return any(routine.values())
+
+
+def _canonical_key(routine: Dict[str, Any], drop_none: bool = True) -> str:
+    """
+    Serialize a routine as compact, sorted-key JSON so equal routines share cache entries
+
+    Compact separators (and dropping unset fields) also keep the prompt's token count down.
+    """
+    if drop_none:
+        routine = {k: v for k, v in routine.items() if v is not None}
+    return orjson.dumps(routine, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str).decode()
+
+
+# Static text around the routine JSON in the summary prompt
+_PROMPT_HEAD = (
+    "Here's a daily routine record in JSON. "
+    "Summarize the household's activity in 2 sentences. "
+    "If the routine looks unusual, mention possible reasons.\n\n"
+    "Routine:\n"
+)
+_PROMPT_TAIL = "\n\nSummary:"
+
+
+@lru_cache(maxsize=1024)
+def _prompt_from_key(key: str) -> str:
+    return f"{_PROMPT_HEAD}{key}{_PROMPT_TAIL}"
 
 
 class NIMLLMService:
@@ -9,29 +209,64 @@ class NIMLLMService:
     # Llama-3.1 Nemotron Nano endpoint
     LLAMA3_ENDPOINT = "https://integrate.api.nvidia.com/v1/chat/completions"
 
+    # Returned without calling the API when a routine has no recorded values
+    EMPTY_ROUTINE_SUMMARY = "No activity recorded."
+
+    MODEL_NAME = "nvidia/llama-3.1-nemotron-nano-8b-v1"
+    SYSTEM_PROMPT = ("You are a healthcare assistant analyzing elderly care patterns. "
+                     "Be concise and focus on actionable insights.")
+
+    # Static parts of every chat completion request; per-call fields are filled in by _build_request
+    _SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+    _PAYLOAD_TEMPLATE = {"model": MODEL_NAME, "top_p": 1.0, "stream": False}
+
     @staticmethod
-    def build_llama3_prompt(routine: Dict[str, Any]) -> str:
+    def build_llama3_prompt(routine: Dict[str, Any], drop_none: bool = True) -> str:
         """
         Build a prompt for Llama-3 to summarize the routine data.
 
         Args:
             routine: Dictionary containing routine metrics
+            drop_none: Leave out fields whose value is None
 
         Returns:
             Formatted prompt string
         """
-        summary = (
-            "Here's a daily routine record in JSON. "
-            "Summarize the household's activity in 2 sentences. "
-            "If the routine looks unusual, mention possible reasons.\n\n"
-            f"Routine:\n{routine}\n\nSummary:"
-        )
-        return summary
+        return _prompt_from_key(_canonical_key(routine, drop_none))
 
     @staticmethod
     def get_llama3_summary(routine_dict: Dict[str, Any]) -> str:
         """
         Call the Llama-3 API to generate a natural language summary of the routine.
+        Summaries are cached per routine, so an identical routine skips the API call, and
+        routines with no recorded values get EMPTY_ROUTINE_SUMMARY without one.
+
+        Args:
+            routine_dict: Dictionary containing routine metrics (wake_up_time, bed_time, etc.)
+
+        Returns:
+            LLM-generated summary string
+
+        Raises:
+            requests.HTTPError: If the API call fails
+            KeyError: If NIM_API_KEY is not found in environment variables
+        """
+        if not _has_activity(routine_dict):
+            return NIMLLMService.EMPTY_ROUTINE_SUMMARY
+
+        key = _canonical_key(routine_dict)
+        summary = _cached_summary(key)
+        if summary is None:
+            summary = NIMLLMService.get_custom_summary(_prompt_from_key(key), max_tokens=128)
+            _cache_summary(key, summary)
+        return summary
+
+    @staticmethod
+    async def aget_llama3_summary(routine_dict: Dict[str, Any]) -> str:
+        """
+        Async version of get_llama3_summary, for use from async handlers.
+
+        Shares the summary cache with get_llama3_summary.
 
         Args:
             routine_dict: Dictionary containing routine metrics (wake_up_time, bed_time, etc.)
@@ -39,67 +274,161 @@ class NIMLLMService:
         Returns:
             LLM-generated summary string
 
+        Raises:
+            httpx.HTTPError: If the API call fails
+            KeyError: If NIM_API_KEY is not found in environment variables
+        """
+        if not _has_activity(routine_dict):
+            return NIMLLMService.EMPTY_ROUTINE_SUMMARY
+
+        key = _canonical_key(routine_dict)
+        summary = _cached_summary(key)
+        if summary is None:
+            summary = await NIMLLMService.aget_custom_summary(_prompt_from_key(key), max_tokens=128)
+            _cache_summary(key, summary)
+        return summary
+
+    @staticmethod
+    def get_llama3_summaries(routines: List[Dict[str, Any]],
+                             max_concurrency: int = SUMMARY_MAX_CONCURRENCY) -> List[str]:
+        """
+        Summarize several routines, running up to max_concurrency API calls at once.
+
+        Args:
+            routines: List of routine dictionaries
+            max_concurrency: Maximum number of requests in flight
+
+        Returns:
+            Summaries in the same order as routines
+
+        Raises:
+            ValueError: If max_concurrency is less than 1
+            requests.HTTPError: If any API call fails
+            KeyError: If NIM_API_KEY is not found in environment variables
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if not routines:
+            return []
+
+        workers = min(max_concurrency, len(routines))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in input order, whatever order the calls finish in
+            return list(executor.map(NIMLLMService.get_llama3_summary, routines))
+
+    @staticmethod
+    def iter_llama3_summary(routine_dict: Dict[str, Any]) -> Iterator[str]:
+        """
+        Stream a summary of the routine, yielding text chunks as the API produces them.
+
+        Args:
+            routine_dict: Dictionary containing routine metrics
+
+        Yields:
+            Pieces of the LLM-generated summary, in order
+
         Raises:
             requests.HTTPError: If the API call fails
             KeyError: If NIM_API_KEY is not found in environment variables
         """
+        if not _has_activity(routine_dict):
+            return iter((NIMLLMService.EMPTY_ROUTINE_SUMMARY,))
+
         prompt = NIMLLMService.build_llama3_prompt(routine_dict)
-        return NIMLLMService.get_custom_summary(prompt, max_tokens=128)
+        return NIMLLMService.iter_custom_summary(prompt, max_tokens=128)
 
     @staticmethod
-    def get_custom_summary(prompt: str, max_tokens: int = 150, temperature: float = 0.7) -> str:
+    def iter_custom_summary(prompt: str, max_tokens: int = 150, temperature: float = 0.7) -> Iterator[str]:
         """
-        Call the Llama-3 API with a custom prompt.
+        Call the Llama-3 API with a custom prompt and stream the response (server-sent events).
 
         Args:
             prompt: Custom prompt for the LLM
             max_tokens: Maximum tokens to generate
             temperature: Temperature for generation (0-1)
 
-        Returns:
-            LLM-generated response string
+        Yields:
+            Pieces of the LLM-generated response, in order
 
         Raises:
             requests.HTTPError: If the API call fails
             KeyError: If NIM_API_KEY is not found in environment variables
         """
-        api_key = os.getenv("NIM_API_KEY")
-        if not api_key:
-            raise KeyError("NIM_API_KEY not found in environment variables")
+        headers, data = NIMLLMService._build_request(prompt, max_tokens, temperature, stream=True)
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        try:
+            with _post_with_retry(
+                NIMLLMService.LLAMA3_ENDPOINT,
+                headers=headers,
+                data=orjson.dumps(data),
+                timeout=30,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+
+                for line in response.iter_lines():
+                    # SSE frames look like "data: {...}"; skip keep-alives and other fields
+                    if isinstance(line, bytes):
+                        line = line.decode("utf-8")
+                    if not line.startswith("data:"):
+                        continue
+                    frame = line[5:].strip()
+                    if frame == "[DONE]":
+                        break
+
+                    for choice in orjson.loads(frame).get("choices", ()):
+                        content = choice.get("delta", {}).get("content")
+                        if content:
+                            yield content
+
+        except requests.exceptions.RequestException as e:
+            print(f"⚠ Error streaming from NIM LLM API: {e}")
+            raise
+
+    @staticmethod
+    def _build_request(prompt: str, max_tokens: int, temperature: float,
+                       stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the (headers, payload) pair for a chat completion request"""
+        headers = _get_auth_headers()
 
         data = {
-            "model": "nvidia/llama-3.1-nemotron-nano-8b-v1",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a healthcare assistant analyzing elderly care patterns. Be concise and focus on actionable insights."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            **NIMLLMService._PAYLOAD_TEMPLATE,
+            "messages": [NIMLLMService._SYSTEM_MESSAGE, {"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
             "temperature": temperature,
-            "top_p": 1.0,
-            "stream": False
+            "stream": stream
         }
+        return headers, data
+
+    @staticmethod
+    def get_custom_summary(prompt: str, max_tokens: int = 150, temperature: float = 0.7) -> str:
+        """
+        Call the Llama-3 API with a custom prompt.
+
+        Args:
+            prompt: Custom prompt for the LLM
+            max_tokens: Maximum tokens to generate
+            temperature: Temperature for generation (0-1)
+
+        Returns:
+            LLM-generated response string
+
+        Raises:
+            requests.HTTPError: If the API call fails
+            KeyError: If NIM_API_KEY is not found in environment variables
+        """
+        headers, data = NIMLLMService._build_request(prompt, max_tokens, temperature)
 
         try:
-            response = requests.post(
+            response = _post_with_retry(
                 NIMLLMService.LLAMA3_ENDPOINT,
                 headers=headers,
-                json=data,
+                data=orjson.dumps(data),
                 timeout=30
             )
             response.raise_for_status()
 
-            result = response.json()
+            result = orjson.loads(response.content)
             # Extract the generated text from the response
             summary = result["choices"][0]["message"]["content"].strip()
             return summary
@@ -107,3 +436,37 @@ class NIMLLMService:
         except requests.exceptions.RequestException as e:
             print(f"⚠ Error calling NIM LLM API: {e}")
             raise
+
+    @staticmethod
+    async def aget_custom_summary(prompt: str, max_tokens: int = 150, temperature: float = 0.7) -> str:
+        """
+        Async version of get_custom_summary, sent over the shared httpx.AsyncClient.
+
+        Args:
+            prompt: Custom prompt for the LLM
+            max_tokens: Maximum tokens to generate
+            temperature: Temperature for generation (0-1)
+
+        Returns:
+            LLM-generated response string
+
+        Raises:
+            httpx.HTTPError: If the API call fails
+            KeyError: If NIM_API_KEY is not found in environment variables
+        """
+        headers, data = NIMLLMService._build_request(prompt, max_tokens, temperature)
+
+        try:
+            response = await _apost_with_retry(
+                NIMLLMService.LLAMA3_ENDPOINT,
+                headers=headers,
+                content=orjson.dumps(data)
+            )
+            response.raise_for_status()
+
+            result = orjson.loads(response.content)
+            return result["choices"][0]["message"]["content"].strip()
+
+        except httpx.HTTPError as e:
+            print(f"⚠ Error calling NIM LLM API: {e}")
+            raise
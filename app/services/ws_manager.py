@@ -1,108 +1,68 @@
 # app/services/ws_manager.py
-from typing import Dict, List, Optional
-import json
-from datetime import datetime
+from typing import Dict, Optional, Set
+from collections import defaultdict, OrderedDict
+from datetime import datetime, timezone
 import asyncio
+import logging
 import os
-from kafka import KafkaConsumer
-from kafka.errors import KafkaError
+import time
+import orjson
+from aiokafka import AIOKafkaConsumer, TopicPartition
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List] = {}
-        # In-memory cache: {household_id: {resident: {"location": str, "timestamp": str}}}
-        self.location_cache: Dict[str, Dict[str, Dict[str, str]]] = {}
-
-    async def connect(self, websocket, household_id: str):
-        await websocket.accept()
-        if household_id not in self.active_connections:
-            self.active_connections[household_id] = []
-        self.active_connections[household_id].append(websocket)
+logger = logging.getLogger(__name__)
 
-    async def add_connection_with_state(self, websocket, household_id: str):
-        """Add an already-accepted WebSocket connection and send initial state"""
-        print(f"📤 Starting add_connection_with_state for {household_id}")
+# How long to wait before retrying a failed resident-state load (seconds)
+STATE_RELOAD_BACKOFF_SECONDS = 30.0
+# Upper bound on a single resident-state replay (seconds)
+STATE_LOAD_TIMEOUT_SECONDS = 10.0
+# Max households tracked for no-listener warning throttling
+WARNING_COUNT_MAXSIZE = 10_000
 
-        if household_id not in self.active_connections:
-            self.active_connections[household_id] = []
-        self.active_connections[household_id].append(websocket)
-        print(f"📝 Added connection to list for {household_id}, total: {len(self.active_connections[household_id])}")
 
-        # Fetch recent events directly from Kafka
-        residents_data = {}
-        timestamps = {}
+class LRUCounter(OrderedDict):
+    """Counter dict (missing keys read as 0) that evicts the least recently updated key past maxsize"""
 
-        try:
-            # Read recent events from Kafka topic
-            bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
-            topic = os.getenv("KAFKA_TOPIC_EVENTS", "wellnest-events")
-
-            print(f"🔌 Connecting to Kafka at {bootstrap_servers} to fetch recent events...")
-
-            # Create a consumer to read recent messages
-            consumer = KafkaConsumer(
-                topic,
-                bootstrap_servers=bootstrap_servers,
-                auto_offset_reset='earliest',  # Start from beginning to get recent history
-                enable_auto_commit=False,
-                group_id=f'initial-state-{household_id}',  # Unique group per household
-                value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-                consumer_timeout_ms=2000  # 2 second timeout
-            )
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
 
-            # Poll to trigger partition assignment
-            consumer.poll(timeout_ms=100)
+    def __missing__(self, key):
+        return 0
 
-            # Check if partitions are assigned
-            if consumer.assignment():
-                # Seek to end first to get partition info
-                consumer.seek_to_end()
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
 
-                # Now seek backwards to get last N messages (e.g., last 100)
-                for partition in consumer.assignment():
-                    current_position = consumer.position(partition)
-                    # Go back 100 messages or to beginning
-                    new_position = max(0, current_position - 100)
-                    consumer.seek(partition, new_position)
 
-                # Consume and process messages
-                messages = consumer.poll(timeout_ms=2000)
-            else:
-                print(f"⚠️ No partitions assigned yet for topic {topic}")
-                messages = {}
-
-            for topic_partition, records in messages.items():
-                for record in records:
-                    event = record.value
+class ConnectionManager:
+    def __init__(self):
+        self.active_connections: Dict[str, Set] = defaultdict(set)
+        # In-memory cache: {household_id: {resident: {"location": str, "timestamp": str}}}
+        self.location_cache: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # Resident-state bootstrap from the compacted topic (single-flight, loaded once)
+        self._state_loaded = False
+        self._state_load: Optional[asyncio.Future] = None
+        self._state_load_failed_at: Optional[float] = None
+        # Per-household count of sends with no listeners, used to throttle warnings.
+        # LRU-bounded so arbitrary household_ids can't grow it without limit
+        self._warning_count: Dict[str, int] = LRUCounter(WARNING_COUNT_MAXSIZE)
 
-                    # Only process events for this household
-                    if event.get("household_id") == household_id:
-                        resident = event.get("resident")
-                        location = event.get("location")
-                        timestamp = event.get("timestamp") or event.get("last_active")
+    async def connect(self, websocket, household_id: str):
+        await websocket.accept()
+        self.active_connections[household_id].add(websocket)
 
-                        if resident and location:
-                            # Always update with latest (newer messages come later)
-                            residents_data[resident] = location
-                            if timestamp:
-                                timestamps[resident] = timestamp
+    async def add_connection_with_state(self, websocket, household_id: str):
+        """Add an already-accepted WebSocket connection and send initial state"""
+        logger.debug("Starting add_connection_with_state for %s", household_id)
 
-            consumer.close()
-            print(f"🔍 Kafka fetch for {household_id}: {len(residents_data)} residents")
+        self.active_connections[household_id].add(websocket)
+        logger.debug("Added connection to set for %s, total: %d",
+                     household_id, len(self.active_connections[household_id]))
 
-        except Exception as e:
-            print(f"⚠️ Error fetching events from Kafka: {e}")
-            import traceback
-            traceback.print_exc()
-
-        # If Kafka returned no data, fall back to in-memory cache
-        if not residents_data and household_id in self.location_cache:
-            print(f"💾 Kafka returned no data, using cache for {household_id}")
-            cache_data = self.location_cache[household_id]
-            for resident, data in cache_data.items():
-                residents_data[resident] = data.get("location")
-                timestamps[resident] = data.get("timestamp")
-            print(f"💾 Cache hit! Loaded {len(residents_data)} residents from cache")
+        # Latest locations come from the materialized resident state (bootstrapped once from Kafka)
+        residents_data, timestamps = await self._get_initial_state(household_id)
 
         initial_state = {
             "type": "initial_state",
@@ -111,31 +71,134 @@ class ConnectionManager:
         }
 
         try:
-            print(f"📨 Attempting to send initial state to {household_id}...")
-            await websocket.send_json(initial_state)
+            # orjson text frame, matching send_alert (the dashboard JSON.parses text frames)
+            await websocket.send_text(orjson.dumps(initial_state, default=str).decode())
             if residents_data:
-                print(f"✓ Sent initial state to household {household_id}: {len(residents_data)} residents with timestamps")
-                # Debug: Show what we're actually sending
-                for resident, location in residents_data.items():
-                    ts = timestamps.get(resident, "no timestamp")
-                    print(f"  - {resident}: {location} (ts: {ts})")
+                logger.info("Sent initial state to household %s: %d residents with timestamps",
+                            household_id, len(residents_data))
+                # Debug: Show what we're actually sending, as one line (skipped entirely unless DEBUG is on)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Initial state for %s: %s", household_id, {
+                        resident: (location, timestamps.get(resident, "no timestamp"))
+                        for resident, location in residents_data.items()
+                    })
             else:
-                print(f"✓ Sent empty initial state to household {household_id} (no cached data yet)")
+                logger.info("Sent empty initial state to household %s (no cached data yet)", household_id)
         except Exception as e:
-            print(f"❌ Failed to send initial state for {household_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning("Failed to send initial state for %s: %s", household_id, e, exc_info=True)
+
+    async def _get_initial_state(self, household_id: str):
+        """Return copies of the latest {resident: location} and {resident: timestamp} for a household"""
+        if not self._state_loaded:
+            await self.load_resident_state()
+
+        household_cache = self.location_cache.get(household_id, {})
+        residents_data = {resident: data.get("location") for resident, data in household_cache.items()}
+        timestamps = {resident: data.get("timestamp") for resident, data in household_cache.items()}
+        return residents_data, timestamps
+
+    async def load_resident_state(self):
+        """
+        Bootstrap location_cache from the compacted resident-state topic
+
+        Called at startup and lazily by the first connect. Concurrent callers share one
+        in-flight load; after a failure, retries are skipped for STATE_RELOAD_BACKOFF_SECONDS
+        and connects are served from whatever the live events consumer has cached.
+        """
+        if self._state_loaded:
+            return
+        if (self._state_load_failed_at is not None
+                and time.monotonic() - self._state_load_failed_at < STATE_RELOAD_BACKOFF_SECONDS):
+            return
+
+        if self._state_load is None:
+            self._state_load = asyncio.ensure_future(self._load_resident_state())
+        load = self._state_load
+        try:
+            # Shield so a cancelled waiter doesn't cancel the load other connects are waiting on
+            await asyncio.shield(load)
+        finally:
+            if self._state_load is load and load.done():
+                self._state_load = None
+
+    async def _load_resident_state(self):
+        """Replay the compacted topic (latest value per household:resident key) into location_cache"""
+        bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+        topic = os.getenv("KAFKA_TOPIC_RESIDENT_STATE", "wellnest-resident-state")
+
+        # No topic subscription and no group_id: partitions are assigned manually below, so there
+        # is no group coordinator, no rebalance, and no offsets written to __consumer_offsets
+        consumer = AIOKafkaConsumer(
+            bootstrap_servers=bootstrap_servers,
+            enable_auto_commit=False,
+            group_id=None,
+            # Tombstones (null values) carry no state; keep them as None and skip below
+            value_deserializer=lambda x: orjson.loads(x) if x else None
+        )
+
+        try:
+            logger.debug("Loading resident state from %s at %s", topic, bootstrap_servers)
+            await consumer.start()
+
+            loaded = 0
+            # Bound the whole replay so a slow broker can't hold up connects indefinitely
+            async with asyncio.timeout(STATE_LOAD_TIMEOUT_SECONDS):
+                await consumer.topics()  # Refresh cluster metadata so the topic's partitions are known
+                partitions = [TopicPartition(topic, p) for p in consumer.partitions_for_topic(topic) or ()]
+                if not partitions:
+                    raise RuntimeError(f"Topic {topic} has no partitions (does it exist?)")
+
+                # Compacted topic: replaying from the beginning up to the end offsets yields current state
+                consumer.assign(partitions)
+                await consumer.seek_to_beginning(*partitions)
+                end_offsets = await consumer.end_offsets(partitions)
+                remaining = {tp for tp in partitions if end_offsets[tp] > 0}
+
+                while remaining:
+                    batches = await consumer.getmany(*remaining, timeout_ms=500)
+                    for tp, records in batches.items():
+                        for record in records:
+                            state = record.value
+                            if not state:
+                                continue
+                            household_id = state.get("household_id")
+                            resident = state.get("resident")
+                            location = state.get("location")
+                            if household_id and resident and location:
+                                # Entries written by the live consumer since startup are newer; keep them
+                                self.location_cache.setdefault(household_id, {}).setdefault(resident, {
+                                    "location": location,
+                                    "timestamp": state.get("timestamp")
+                                })
+                                loaded += 1
+                    # A partition is done once we've consumed up to its end offset at load time
+                    remaining = {tp for tp in remaining if await consumer.position(tp) < end_offsets[tp]}
+
+            self._state_loaded = True
+            self._state_load_failed_at = None
+            logger.info("Loaded %d resident locations from %s", loaded, topic)
+
+        except Exception as e:
+            self._state_load_failed_at = time.monotonic()
+            logger.warning("Error loading resident state from Kafka: %s", e, exc_info=True)
+        finally:
+            await consumer.stop()
 
     def add_connection(self, websocket, household_id: str):
         """Add an already-accepted WebSocket connection"""
-        if household_id not in self.active_connections:
-            self.active_connections[household_id] = []
-        self.active_connections[household_id].append(websocket)
+        self.active_connections[household_id].add(websocket)
 
-    async def update_resident_location(self, household_id: str, resident: str, location: str):
+    async def update_resident_location(self, household_id: str, resident: str, location: str,
+                                       timestamp: Optional[str] = None):
         """
         Update the in-memory cache with resident's latest location
         Called by events_consumer when forwarding Kafka events to WebSocket
+
+        Args:
+            household_id: The household ID
+            resident: Resident name
+            location: Resident's latest location
+            timestamp: Pre-formatted UTC ISO timestamp; generated when omitted
         """
         # Initialize household cache if it doesn't exist
         if household_id not in self.location_cache:
@@ -144,60 +207,78 @@ class ConnectionManager:
         # Update or create resident's location entry
         self.location_cache[household_id][resident] = {
             "location": location,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": timestamp or datetime.now(timezone.utc).isoformat()
         }
 
-        print(f"💾 Updated cache: {household_id}/{resident} -> {location}")
+        logger.debug("Updated cache: %s/%s -> %s", household_id, resident, location)
+
+    def connection_count(self, household_id: str) -> int:
+        """Number of open connections for a household (O(1); doesn't create an entry for unknown households)"""
+        connections = self.active_connections.get(household_id)
+        return len(connections) if connections else 0
 
     def disconnect(self, websocket, household_id: str):
-        if household_id in self.active_connections:
-            try:
-                self.active_connections[household_id].remove(websocket)
-                # Clean up empty connection lists immediately
-                if not self.active_connections[household_id]:
-                    del self.active_connections[household_id]
-                    print(f"🧹 Cleaned up connection list for household {household_id}")
-            except ValueError:
-                # Connection wasn't in the list
-                pass
+        # Use .get() so unknown households don't get an empty set created
+        connections = self.active_connections.get(household_id)
+        if connections is None:
+            return
+
+        connections.discard(websocket)
+        # Clean up empty connection sets immediately
+        if not connections:
+            del self.active_connections[household_id]
+            logger.debug("Cleaned up connection set for household %s", household_id)
 
     async def send_alert(self, household_id: str, message: dict):
         # Check if there are any active connections for this household
-        if household_id not in self.active_connections or not self.active_connections[household_id]:
-            # Only print warning occasionally to avoid log spam
-            if not hasattr(self, '_warning_count'):
-                self._warning_count = {}
-            if household_id not in self._warning_count:
-                self._warning_count[household_id] = 0
-            self._warning_count[household_id] += 1
-
+        connections = self.active_connections.get(household_id)
+        if not connections:
             # Only warn every 10th attempt to reduce log noise
-            if self._warning_count[household_id] % 10 == 1:
-                print(f"⚠️ No active WebSocket connections for household {household_id} (suppressing further warnings)")
+            count = self._warning_count[household_id] = self._warning_count[household_id] + 1
+            if count % 10 == 1:
+                logger.warning("No active WebSocket connections for household %s (suppressing further warnings)",
+                               household_id)
             return
 
-        dead_connections = []
-        for connection in self.active_connections[household_id]:
+        # Encode once for all listeners; sent as a text frame, same as send_json would
+        payload = orjson.dumps(message, default=str).decode()
+
+        # Snapshot the set (it may change while we await) and send to all listeners concurrently,
+        # so one slow socket doesn't delay the rest
+        targets = tuple(connections)
+        if len(targets) == 1:
+            # Common case (one open dashboard): await directly, skipping gather's per-socket Task
             try:
-                await connection.send_json(message)
-                print(f"✓ Alert sent via WebSocket to household {household_id}")
+                await targets[0].send_text(payload)
+                results = (None,)
             except Exception as e:
-                print(f"❌ Failed to send alert via WebSocket to household {household_id}: {e}")
+                results = (e,)
+        else:
+            results = await asyncio.gather(
+                *(connection.send_text(payload) for connection in targets), return_exceptions=True
+            )
+
+        dead_connections = []
+        for connection, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to send alert via WebSocket to household %s: %s", household_id, result)
                 dead_connections.append(connection)
 
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Alert sent via WebSocket to %d connection(s) for household %s",
+                         len(connections) - len(dead_connections), household_id)
+
         # Clean up dead connections
         for conn in dead_connections:
-            try:
-                self.active_connections[household_id].remove(conn)
-                print(f"🧹 Removed dead WebSocket connection for household {household_id}")
-            except ValueError:
-                # Connection already removed
-                pass
-
-        # Clean up empty connection lists
-        if household_id in self.active_connections and not self.active_connections[household_id]:
+            connections.discard(conn)
+        if dead_connections:
+            logger.debug("Removed %d dead WebSocket connection(s) for household %s",
+                         len(dead_connections), household_id)
+
+        # Clean up empty connection sets
+        if not connections and self.active_connections.get(household_id) is connections:
             del self.active_connections[household_id]
-            print(f"🧹 Cleaned up empty connection list for household {household_id}")
+            logger.debug("Cleaned up empty connection set for household %s", household_id)
 
     async def send_alert_resolved(self, household_id: str, resolution_info: dict):
         """
@@ -213,7 +294,7 @@ class ConnectionManager:
             "alert_type": resolution_info.get("type"),
             "message": resolution_info.get("message"),
             "resolved_count": resolution_info.get("resolved_count", 1),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
         await self.send_alert(household_id, message)
@@ -3,18 +3,28 @@ Test Configuration and Fixtures
 Provides common fixtures and utilities for all tests
 """
 import pytest
-import asyncio
 from datetime import datetime, timezone, timedelta
+from types import MappingProxyType
 from unittest.mock import Mock, AsyncMock, MagicMock
-from typing import Dict, List, Any
+from typing import Dict, List, Any, NamedTuple
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an event loop for async tests"""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+def freeze(value):
+    """Recursively convert dicts to read-only MappingProxyType and lists to tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Inverse of freeze(): return a mutable deep copy of a frozen fixture"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
 
 
 @pytest.fixture
@@ -23,10 +33,10 @@ def sample_household_id():
     return "household_001"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_event():
-    """Sample event data for testing"""
-    return {
+    """Sample event data for testing (read-only; use thaw() or {**sample_event, ...} for a modified copy)"""
+    return freeze({
         "event_id": "test_event_123",
         "household_id": "household_001",
         "timestamp": "2025-01-15T08:30:00",
@@ -35,13 +45,20 @@ def sample_event():
         "location": "kitchen",
         "value": "True",
         "resident": "grandmom"
-    }
+    })
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def event_model(sample_event):
+    """sample_event as an Event built once per session without validation (use model_copy() to modify)"""
+    from app.schema.event import Event
+    return Event.from_trusted(sample_event)
+
+
+@pytest.fixture(scope="session")
 def sample_event_create():
-    """Sample EventCreate data"""
-    return {
+    """Sample EventCreate data (read-only; use thaw() for a mutable copy)"""
+    return freeze({
         "household_id": "household_001",
         "timestamp": "2025-01-15T08:30:00",
         "sensor_id": "motion_kitchen",
@@ -49,14 +66,21 @@ def sample_event_create():
         "location": "kitchen",
         "value": "True",
         "resident": "grandmom"
-    }
+    })
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def event_create(sample_event_create):
+    """sample_event_create validated into an EventCreate once per session (treat as read-only)"""
+    from app.schema.event import EventCreate
+    return EventCreate(**sample_event_create)
+
+
+@pytest.fixture(scope="session")
 def sample_events_sequence():
-    """Sample sequence of events for a day"""
+    """Sample sequence of events for a day (read-only; use thaw() for a mutable copy)"""
     base_date = "2025-01-15"
-    return [
+    return freeze([
         {
             "event_id": "evt_001",
             "household_id": "household_001",
@@ -107,13 +131,13 @@ def sample_events_sequence():
             "value": "True",  # Go to bed
             "resident": "grandmom"
         },
-    ]
+    ])
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_baseline():
-    """Sample baseline data for anomaly detection"""
-    return {
+    """Sample baseline data for anomaly detection (read-only; use thaw() for a mutable copy)"""
+    return freeze({
         "_id": "household_001_2025-01-15_baseline7",
         "household_id": "household_001",
         "baseline_type": "rolling7",
@@ -146,7 +170,7 @@ def sample_baseline():
             "earliest": "21:30",
             "latest": "23:00"
         }
-    }
+    })
 
 
 @pytest.fixture
@@ -163,39 +187,150 @@ def sample_alert():
     }
 
 
-@pytest.fixture
-def mock_mongodb():
-    """Mock MongoDB client"""
+def _resettable_mock(**methods) -> MagicMock:
+    """MagicMock with the given method mocks installed, remembering them for _restore_mock()"""
     mock = MagicMock()
-    mock.connect = AsyncMock()
-    mock.read = AsyncMock(return_value=[])
-    mock.write = AsyncMock(return_value="mock_id_123")
-    mock.aggregate = AsyncMock(return_value=[])
-    mock.distinct = AsyncMock(return_value=[])
-    mock.close = AsyncMock()
+    for name, method in methods.items():
+        setattr(mock, name, method)
+    mock._defaults = {name: (method, method.return_value) for name, method in methods.items()}
     return mock
 
 
+def _restore_mock(mock: MagicMock):
+    """Undo a test's changes to a shared mock: reinstall default methods, clear calls and side effects"""
+    for name, (method, return_value) in mock._defaults.items():
+        setattr(mock, name, method)
+        method.reset_mock(side_effect=True)
+        method.return_value = return_value
+    mock.reset_mock(side_effect=True)
+
+
+@pytest.fixture(scope="session")
+def mock_mongodb():
+    """Mock MongoDB client (shared; restored after every test by _reset_mocks)"""
+    return _resettable_mock(
+        connect=AsyncMock(),
+        read=AsyncMock(return_value=[]),
+        write=AsyncMock(return_value="mock_id_123"),
+        write_batched=AsyncMock(return_value="mock_id_123"),
+        upsert=AsyncMock(return_value=True),
+        aggregate=AsyncMock(return_value=[]),
+        distinct=AsyncMock(return_value=[]),
+        close=AsyncMock(),
+    )
+
+
+class FakeMongo:
+    """
+    Plain-async stand-in for MongoDB, cheaper than a MagicMock tree
+
+    Reads and distincts are served in order from the queued lists (then []),
+    writes/upserts/updates are recorded as (collection, ...) tuples.
+    """
+
+    def __init__(self):
+        self.reads: List[Any] = []
+        self.distincts: List[Any] = []
+        self.writes: List[tuple] = []
+        self.updates: List[tuple] = []
+
+    async def read(self, collection_name, query=None, **kwargs):
+        return self.reads.pop(0) if self.reads else []
+
+    async def distinct(self, collection_name, field, query=None):
+        return self.distincts.pop(0) if self.distincts else []
+
+    async def aggregate(self, collection_name, pipeline):
+        return []
+
+    async def write(self, collection_name, document):
+        self.writes.append((collection_name, document))
+        return str(document.get("_id", "fake_id"))
+
+    write_batched = write
+
+    async def upsert(self, collection_name, query, document):
+        self.writes.append((collection_name, document))
+        return True
+
+    async def update(self, collection_name, query, update):
+        self.updates.append((collection_name, query, update))
+        return 0
+
+
 @pytest.fixture
+def fake_mongodb():
+    """Lightweight MongoDB stub for tests that only feed reads and inspect writes"""
+    return FakeMongo()
+
+
+@pytest.fixture(scope="session")
 def mock_kafka():
-    """Mock Kafka client"""
-    mock = MagicMock()
-    mock.connect = AsyncMock()
-    mock.publish_event = Mock()
-    mock.close = Mock()
-    return mock
+    """Mock Kafka client (shared; restored after every test by _reset_mocks)"""
+    return _resettable_mock(
+        connect=AsyncMock(),
+        publish_event=Mock(),
+        close=Mock(),
+    )
+
+
+@pytest.fixture(autouse=True)
+def _reset_mocks(mock_mongodb, mock_kafka):
+    """Hand every test the shared client mocks in their default state"""
+    yield
+    _restore_mock(mock_mongodb)
+    _restore_mock(mock_kafka)
+
+
+class IngestEnv(NamedTuple):
+    """Mocks installed into app.api.event_ingestion_service by the ingest_env fixture"""
+    mongodb: MagicMock
+    kafka: MagicMock
+    detector: MagicMock
 
 
 @pytest.fixture
-def mock_websocket():
-    """Mock WebSocket connection"""
-    mock = MagicMock()
-    mock.accept = AsyncMock()
-    mock.send_json = AsyncMock()
-    mock.send_text = AsyncMock()
-    mock.receive_text = AsyncMock(return_value='{"ping": "pong"}')
-    mock.close = AsyncMock()
-    return mock
+def ingest_env(monkeypatch, mock_mongodb, mock_kafka):
+    """Patch MongoDB, KafkaClient and detector for ingest_event in one go"""
+    detector = MagicMock()
+    detector.update_state_on_event = AsyncMock()
+
+    module = "app.api.event_ingestion_service"
+    monkeypatch.setattr(f"{module}.MongoDB", mock_mongodb)
+    monkeypatch.setattr(f"{module}.KafkaClient", mock_kafka)
+    monkeypatch.setattr(f"{module}.detector", detector)
+    return IngestEnv(mock_mongodb, mock_kafka, detector)
+
+
+@pytest.fixture(scope="module")
+def nim_mock_client():
+    """One mocked NVIDIAEmbeddings client per test module (spec_set: no ad-hoc attributes)"""
+    from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+    return Mock(spec_set=NVIDIAEmbeddings)
+
+
+@pytest.fixture
+def nim_client(monkeypatch, nim_mock_client):
+    """Install the shared mock client on NIMEmbeddingService for one test, reset afterwards"""
+    from app.services.nim_embedding_service import NIMEmbeddingService
+    monkeypatch.setattr(NIMEmbeddingService, "client", nim_mock_client)
+    yield nim_mock_client
+    nim_mock_client.reset_mock(return_value=True, side_effect=True)
+
+
+@pytest.fixture
+def nim_uninitialized(monkeypatch):
+    """Run a test with NIMEmbeddingService not yet initialized"""
+    from app.services.nim_embedding_service import NIMEmbeddingService
+    monkeypatch.setattr(NIMEmbeddingService, "client", None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One TestClient per session; used without `with`, so startup hooks (MongoDB, Kafka, scheduler) don't run"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
 
 
 @pytest.fixture
@@ -217,26 +352,37 @@ def daily_routine_sample():
     }
 
 
-@pytest.fixture
+# Seven consecutive days ending yesterday, formatted once at import
+_ROUTINE_DATES = tuple(
+    (datetime.now() - timedelta(days=i + 1)).strftime("%Y-%m-%d") for i in range(7)
+)
+
+# Per-day routine fields with slight day-to-day variation (index i matches _ROUTINE_DATES[i])
+_ROUTINE_TEMPLATE = (
+    {"wake_up_time": "06:30", "bed_time": "22:00", "first_kitchen_time": "07:00", "bathroom_first_time": "06:35", "total_bathroom_events": 3, "total_events": 40},
+    {"wake_up_time": "06:35", "bed_time": "22:10", "first_kitchen_time": "07:05", "bathroom_first_time": "06:40", "total_bathroom_events": 4, "total_events": 42},
+    {"wake_up_time": "06:40", "bed_time": "22:20", "first_kitchen_time": "07:10", "bathroom_first_time": "06:45", "total_bathroom_events": 5, "total_events": 44},
+    {"wake_up_time": "06:30", "bed_time": "22:30", "first_kitchen_time": "07:15", "bathroom_first_time": "06:35", "total_bathroom_events": 6, "total_events": 46},
+    {"wake_up_time": "06:35", "bed_time": "22:00", "first_kitchen_time": "07:20", "bathroom_first_time": "06:40", "total_bathroom_events": 3, "total_events": 48},
+    {"wake_up_time": "06:40", "bed_time": "22:10", "first_kitchen_time": "07:25", "bathroom_first_time": "06:45", "total_bathroom_events": 4, "total_events": 50},
+    {"wake_up_time": "06:30", "bed_time": "22:20", "first_kitchen_time": "07:00", "bathroom_first_time": "06:35", "total_bathroom_events": 5, "total_events": 52},
+)
+
+
+@pytest.fixture(scope="session")
 def multiple_daily_routines():
-    """Multiple days of routine data for baseline calculation"""
-    routines = []
-    for i in range(7):
-        date = (datetime.now() - timedelta(days=i+1)).strftime("%Y-%m-%d")
-        routines.append({
+    """Multiple days of routine data for baseline calculation (read-only; use thaw() for a mutable copy)"""
+    return freeze([
+        {
             "_id": f"household_001_{date}",
             "household_id": "household_001",
             "date": date,
-            "wake_up_time": f"06:{30 + (i % 3) * 5}",  # Slight variation
-            "bed_time": f"22:{(i % 4) * 10}",
-            "first_kitchen_time": f"07:{(i % 6) * 5}",
-            "bathroom_first_time": f"06:{35 + (i % 3) * 5}",
-            "total_bathroom_events": 3 + (i % 4),
-            "activity_start": f"06:{30 + (i % 3) * 5}",
-            "activity_end": f"22:{(i % 4) * 10}",
-            "total_events": 40 + i * 2
-        })
-    return routines
+            **day,
+            "activity_start": day["wake_up_time"],
+            "activity_end": day["bed_time"],
+        }
+        for date, day in zip(_ROUTINE_DATES, _ROUTINE_TEMPLATE)
+    ])
 
 
 # Helper functions for tests
@@ -3,23 +3,125 @@ Tests for Anomaly Detector Service
 Tests anomaly detection logic, state management, alert generation, and de-duplication
 """
 import pytest
+from dataclasses import replace
 from datetime import datetime, timezone, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch, call
-from app.services.anomaly_detector import AnomalyDetector
+from freezegun import freeze_time
+from app.services.anomaly_detector import AnomalyDetector, HouseholdState
+
+
+# Reference times for cooldown/expiry tests; only their distance from now matters
+_NOW = datetime.now(timezone.utc)
+_ONE_HOUR_AGO = _NOW - timedelta(hours=1)
+_THREE_HOURS_AGO = _NOW - timedelta(hours=3)
+_25_HOURS_AGO = _NOW - timedelta(hours=25)
+_YESTERDAY = _NOW - timedelta(days=1)
+
+
+# Shared starting states; tests derive their own copy with dataclasses.replace()
+_BASE_STATE = HouseholdState()
+# Household state after a 06:30 wake-up
+_AWAKE_STATE = replace(_BASE_STATE, wake_detected=True, wake_up_time="06:30")
+
+
+def _event(sensor_type, location, value, time):
+    return {
+        "sensor_type": sensor_type,
+        "location": location,
+        "value": value,
+        "timestamp": f"2025-01-15T{time}:00"
+    }
+
+
+def _async_return(value):
+    """Plain coroutine function returning value; cheaper than AsyncMock where calls aren't asserted"""
+    async def _return(*args, **kwargs):
+        return value
+    return _return
+
+
+# (initial state, events applied in order, expected state fields)
+UPDATE_STATE_CASES = [
+    pytest.param(_BASE_STATE, [_event("bed_presence", "bedroom1", "False", "06:30")],
+                 {"wake_detected": True, "wake_up_time": "06:30"}, id="wake_detection"),
+    pytest.param(_AWAKE_STATE, [_event("motion", "kitchen", "True", "07:00")],
+                 {"kitchen_visited": True, "first_kitchen_time": "07:00"}, id="kitchen_visit"),
+    pytest.param(_AWAKE_STATE, [_event("motion", "bathroom1", "True", "07:00")],
+                 {"bathroom_count": 1}, id="bathroom_once"),
+    pytest.param(_AWAKE_STATE, [_event("motion", "bathroom1", "True", "07:00"),
+                                _event("motion", "bathroom2", "True", "08:00")],
+                 {"bathroom_count": 2}, id="bathroom_count"),
+    pytest.param(_AWAKE_STATE, [_event("motion", "livingroom", "True", "10:00")],
+                 {"last_motion_time": "2025-01-15T10:00:00", "last_location": "livingroom"}, id="motion_tracking"),
+    pytest.param(_AWAKE_STATE, [_event("door", "entrance", "True", "08:00")],
+                 {"door_opened": True}, id="door_opened"),
+]
+
+
+# (state changes from _AWAKE_STATE, current time, expected anomaly type, expected severity)
+DETECT_CASES = [
+    pytest.param(
+        {"last_motion_time": "2025-01-15T09:30:00", "last_location": "bedroom1"},
+        "2025-01-15T10:00:00+00:00", "missed_kitchen_activity", "medium",
+        id="missed_kitchen_activity"
+    ),
+    pytest.param(
+        # 3.5 hours since the last motion
+        {"kitchen_visited": True, "first_kitchen_time": "07:00", "bathroom_count": 1,
+         "last_motion_time": "2025-01-15T08:00:00", "last_location": "livingroom"},
+        "2025-01-15T11:30:00+00:00", "prolonged_inactivity", "high",
+        id="prolonged_inactivity"
+    ),
+    pytest.param(
+        # Baseline max is 6 visits
+        {"kitchen_visited": True, "first_kitchen_time": "07:00", "bathroom_count": 10,
+         "last_motion_time": "2025-01-15T14:00:00", "last_location": "bathroom1"},
+        "2025-01-15T14:30:00+00:00", "excessive_bathroom_visits", "medium",
+        id="excessive_bathroom_visits"
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def _module_detector():
+    """One AnomalyDetector for the whole module"""
+    return AnomalyDetector()
+
+
+@pytest.fixture
+def detector(_module_detector):
+    """The shared AnomalyDetector with all per-household state cleared"""
+    _module_detector.baseline_cache.clear()
+    _module_detector.household_state.clear()
+    _module_detector.last_check_time.clear()
+    _module_detector.recent_alerts.clear()
+    _module_detector.state_locks.clear()
+    return _module_detector
+
+
+@pytest.fixture(autouse=True)
+def _patch_mongo(monkeypatch, mock_mongodb):
+    """Point the detector module at the mock MongoDB for every test"""
+    monkeypatch.setattr('app.services.anomaly_detector.MongoDB', mock_mongodb)
+    return mock_mongodb
+
+
+@pytest.fixture
+def baselined_mongo(mock_mongodb, sample_baseline):
+    """mock_mongodb whose reads return the sample baseline (for get_baseline) then no alerts"""
+    mock_mongodb.read = _async_return([sample_baseline, []])
+    return mock_mongodb
 
 
 class TestAnomalyDetector:
     """Test suite for AnomalyDetector class"""
 
-    @pytest.fixture
-    def detector(self):
-        """Create a fresh detector instance for each test"""
-        return AnomalyDetector()
-
     # ===== Initialization Tests =====
 
-    def test_initialization(self, detector):
+    def test_initialization(self):
         """Test detector initializes with correct default values"""
+        detector = AnomalyDetector()
+
         assert detector.baseline_cache == {}
         assert detector.household_state == {}
         assert detector.last_check_time == {}
@@ -31,7 +133,6 @@ class TestAnomalyDetector:
 
     # ===== Baseline Management Tests =====
 
-    @pytest.mark.asyncio
     async def test_get_baseline_from_cache(self, detector, sample_baseline):
         """Test baseline retrieval from cache"""
         household_id = "household_001"
@@ -43,34 +144,54 @@ class TestAnomalyDetector:
         result = await detector.get_baseline(household_id)
         assert result == sample_baseline
 
-    @pytest.mark.asyncio
     async def test_get_baseline_cache_expired(self, detector, sample_baseline, mock_mongodb):
         """Test baseline fetched from DB when cache is expired"""
         household_id = "household_001"
         # Set cache with old timestamp (more than 24 hours ago)
         detector.baseline_cache[household_id] = {
             'baseline': {'old': 'data'},
-            'cached_at': datetime.now(timezone.utc) - timedelta(hours=25)
+            'cached_at': _25_HOURS_AGO
         }
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[sample_baseline])
-            result = await detector.get_baseline(household_id)
+        mock_mongodb.read = AsyncMock(return_value=[sample_baseline])
+        result = await detector.get_baseline(household_id)
 
-            # Should fetch fresh data from DB
-            assert result == sample_baseline
-            mock_mongodb.read.assert_called_once()
+        # Should fetch fresh data from DB
+        assert result == sample_baseline
+        mock_mongodb.read.assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_get_baseline_no_baseline_found(self, detector, mock_mongodb):
         """Test when no baseline exists in database"""
         household_id = "household_001"
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[])
-            result = await detector.get_baseline(household_id)
+        mock_mongodb.read = _async_return([])
+        result = await detector.get_baseline(household_id)
+
+        assert result is None
+
+    async def test_get_baseline_cached_between_checks(self, detector, sample_baseline, mock_mongodb):
+        """Test repeated lookups hit MongoDB once until the baseline is invalidated"""
+        household_id = "household_001"
+
+        mock_mongodb.read = AsyncMock(return_value=[sample_baseline])
+
+        assert await detector.get_baseline(household_id) == sample_baseline
+        assert await detector.get_baseline(household_id) == sample_baseline
+        assert mock_mongodb.read.call_count == 1
+
+        detector.invalidate_baseline(household_id)
+        await detector.get_baseline(household_id)
+        assert mock_mongodb.read.call_count == 2
+
+    async def test_get_baseline_cache_is_bounded(self, detector, mock_mongodb, monkeypatch):
+        """Test the oldest household is evicted once the cache is full"""
+        monkeypatch.setattr(detector, "BASELINE_CACHE_MAXSIZE", 2)
 
-            assert result is None
+        mock_mongodb.read = _async_return([])
+        for household_id in ("household_001", "household_002", "household_003"):
+            await detector.get_baseline(household_id)
+
+        assert list(detector.baseline_cache) == ["household_002", "household_003"]
 
     # ===== Time Utility Tests =====
 
@@ -89,182 +210,59 @@ class TestAnomalyDetector:
 
     # ===== State Update Tests =====
 
-    def test_update_state_wake_detection(self, detector):
-        """Test state update for wake-up detection"""
-        state = {
-            "wake_detected": False,
-            "wake_up_time": None,
-            "kitchen_visited": False,
-            "bathroom_count": 0,
-            "last_motion_time": None,
-            "last_location": None,
-            "door_opened": False,
-            "first_kitchen_time": None
-        }
-        event = {
-            "sensor_type": "bed_presence",
-            "location": "bedroom1",
-            "value": "False",
-            "timestamp": "2025-01-15T06:30:00"
-        }
-
-        detector._update_state(state, event)
-
-        assert state["wake_detected"] is True
-        assert state["wake_up_time"] == "06:30"
-
-    def test_update_state_kitchen_visit(self, detector):
-        """Test state update for kitchen visit"""
-        state = {
-            "wake_detected": True,
-            "kitchen_visited": False,
-            "first_kitchen_time": None,
-            "bathroom_count": 0,
-            "last_motion_time": None,
-            "last_location": None,
-            "door_opened": False,
-            "wake_up_time": "06:30"
-        }
-        event = {
-            "sensor_type": "motion",
-            "location": "kitchen",
-            "value": "True",
-            "timestamp": "2025-01-15T07:00:00"
-        }
-
-        detector._update_state(state, event)
-
-        assert state["kitchen_visited"] is True
-        assert state["first_kitchen_time"] == "07:00"
-
-    def test_update_state_bathroom_count(self, detector):
-        """Test bathroom visit counting"""
-        state = {
-            "wake_detected": True,
-            "kitchen_visited": False,
-            "bathroom_count": 0,
-            "last_motion_time": None,
-            "last_location": None,
-            "door_opened": False,
-            "first_kitchen_time": None,
-            "wake_up_time": "06:30"
-        }
-        event1 = {
-            "sensor_type": "motion",
-            "location": "bathroom1",
-            "value": "True",
-            "timestamp": "2025-01-15T07:00:00"
-        }
-        event2 = {
-            "sensor_type": "motion",
-            "location": "bathroom2",
-            "value": "True",
-            "timestamp": "2025-01-15T08:00:00"
-        }
-
-        detector._update_state(state, event1)
-        assert state["bathroom_count"] == 1
-
-        detector._update_state(state, event2)
-        assert state["bathroom_count"] == 2
-
-    def test_update_state_motion_tracking(self, detector):
-        """Test motion and location tracking"""
-        state = {
-            "wake_detected": True,
-            "kitchen_visited": False,
-            "bathroom_count": 0,
-            "last_motion_time": None,
-            "last_location": None,
-            "door_opened": False,
-            "first_kitchen_time": None,
-            "wake_up_time": "06:30"
-        }
-        event = {
-            "sensor_type": "motion",
-            "location": "livingroom",
-            "value": "True",
-            "timestamp": "2025-01-15T10:00:00"
-        }
-
-        detector._update_state(state, event)
-
-        assert state["last_motion_time"] == "2025-01-15T10:00:00"
-        assert state["last_location"] == "livingroom"
-
-    def test_update_state_door_opened(self, detector):
-        """Test door opening detection"""
-        state = {
-            "wake_detected": True,
-            "kitchen_visited": False,
-            "bathroom_count": 0,
-            "last_motion_time": None,
-            "last_location": None,
-            "door_opened": False,
-            "first_kitchen_time": None,
-            "wake_up_time": "06:30"
-        }
-        event = {
-            "sensor_type": "door",
-            "location": "entrance",
-            "value": "True",
-            "timestamp": "2025-01-15T08:00:00"
-        }
+    @pytest.mark.parametrize("initial, events, expected", UPDATE_STATE_CASES)
+    def test_update_state(self, detector, initial, events, expected):
+        """Test state updates for wake-up, kitchen, bathroom, motion and door events"""
+        state = replace(initial)
 
-        detector._update_state(state, event)
+        for event in events:
+            detector._update_state(state, event)
 
-        assert state["door_opened"] is True
+        for attr, value in expected.items():
+            assert getattr(state, attr) == value
 
     # ===== Event Processing Tests =====
 
-    @pytest.mark.asyncio
     async def test_update_state_on_event_non_critical(self, detector, sample_event, mock_mongodb):
         """Test event processing for non-critical events"""
-        sample_event["sensor_type"] = "motion"  # Not critical
+        event = {**sample_event, "sensor_type": "motion"}  # Not critical
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[])
-            await detector.update_state_on_event(sample_event)
+        mock_mongodb.read = _async_return([])
+        await detector.update_state_on_event(event)
 
-            # Should update state but not check anomalies
-            assert "household_001" in detector.household_state
+        # Should update state but not check anomalies
+        assert "household_001" in detector.household_state
 
-    @pytest.mark.asyncio
     async def test_update_state_on_event_critical(self, detector, sample_event, mock_mongodb, sample_baseline):
         """Test event processing for critical events (door)"""
-        sample_event["sensor_type"] = "door"
-        sample_event["location"] = "entrance"
+        event = {**sample_event, "sensor_type": "door", "location": "entrance"}
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
+        mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
 
-            with patch.object(detector, 'check_anomalies', new=AsyncMock()) as mock_check:
-                await detector.update_state_on_event(sample_event)
+        with patch.object(detector, 'check_anomalies', new=AsyncMock()) as mock_check:
+            await detector.update_state_on_event(event)
 
-                # Should trigger anomaly check for critical event
-                mock_check.assert_called_once()
+            # Should trigger anomaly check for critical event
+            mock_check.assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_concurrent_event_locking(self, detector, sample_event, mock_mongodb):
         """Test that concurrent events use locking mechanism"""
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[])
+        mock_mongodb.read = _async_return([])
 
-            # Process same household events concurrently
-            await detector.update_state_on_event(sample_event)
+        # Process same household events concurrently
+        await detector.update_state_on_event(sample_event)
 
-            # Lock should exist for household
-            assert "household_001" in detector.state_locks
+        # Lock should exist for household
+        assert "household_001" in detector.state_locks
 
     # ===== Daily State Cache Tests =====
 
-    @pytest.mark.asyncio
     async def test_check_and_reset_daily_cache_new_day(self, detector):
         """Test cache reset when crossing midnight"""
         household_id = "household_001"
-        detector.household_state[household_id] = {"test": "data"}
+        detector.household_state[household_id] = HouseholdState()
         # Set last check to yesterday
-        detector.last_check_time[household_id] = datetime.now(timezone.utc) - timedelta(days=1)
+        detector.last_check_time[household_id] = _YESTERDAY
 
         await detector.check_and_reset_daily_cache(household_id)
 
@@ -273,11 +271,10 @@ class TestAnomalyDetector:
         # Last check time should be updated
         assert household_id in detector.last_check_time
 
-    @pytest.mark.asyncio
     async def test_check_and_reset_daily_cache_same_day(self, detector):
         """Test cache not reset on same day"""
         household_id = "household_001"
-        test_data = {"test": "data"}
+        test_data = HouseholdState(bathroom_count=3)
         detector.household_state[household_id] = test_data
         detector.last_check_time[household_id] = datetime.now(timezone.utc)
 
@@ -289,40 +286,20 @@ class TestAnomalyDetector:
 
     # ===== Alert De-duplication Tests =====
 
-    def test_should_send_alert_first_time(self, detector):
-        """Test alert should be sent first time"""
-        household_id = "household_001"
-        alert_type = "missed_kitchen_activity"
-
-        result = detector.should_send_alert(household_id, alert_type)
-
-        assert result is True
-
-    def test_should_send_alert_within_cooldown(self, detector):
-        """Test alert blocked within cooldown period"""
-        household_id = "household_001"
-        alert_type = "missed_kitchen_activity"
-
-        detector.recent_alerts[household_id] = {
-            alert_type: datetime.now(timezone.utc) - timedelta(hours=1)
-        }
-
-        result = detector.should_send_alert(household_id, alert_type)
-
-        assert result is False
-
-    def test_should_send_alert_after_cooldown(self, detector):
-        """Test alert allowed after cooldown period"""
+    @pytest.mark.parametrize("last_sent, expected", [
+        pytest.param(None, True, id="first_time"),
+        pytest.param(_ONE_HOUR_AGO, False, id="within_cooldown"),
+        pytest.param(_THREE_HOURS_AGO, True, id="after_cooldown"),
+    ])
+    def test_should_send_alert(self, detector, last_sent, expected):
+        """Test alerts are blocked only within the cooldown period"""
         household_id = "household_001"
         alert_type = "missed_kitchen_activity"
 
-        detector.recent_alerts[household_id] = {
-            alert_type: datetime.now(timezone.utc) - timedelta(hours=3)
-        }
-
-        result = detector.should_send_alert(household_id, alert_type)
+        if last_sent is not None:
+            detector.recent_alerts[household_id] = {alert_type: last_sent}
 
-        assert result is True
+        assert detector.should_send_alert(household_id, alert_type) is expected
 
     def test_mark_alert_sent(self, detector):
         """Test marking alert as sent"""
@@ -337,159 +314,71 @@ class TestAnomalyDetector:
 
     # ===== Anomaly Detection Logic Tests =====
 
-    @pytest.mark.asyncio
-    async def test_detect_missed_kitchen_activity(self, detector, sample_baseline, mock_mongodb):
-        """Test detection of missed kitchen activity"""
-        household_id = "household_001"
-        detector.household_state[household_id] = {
-            "wake_detected": True,
-            "kitchen_visited": False,
-            "first_kitchen_time": None,
-            "bathroom_count": 0,
-            "last_motion_time": "2025-01-15T09:30:00",
-            "last_location": "bedroom1",
-            "door_opened": False,
-            "wake_up_time": "06:30"
-        }
-
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            with patch('app.services.anomaly_detector.datetime') as mock_datetime:
-                # Set current time to 10:00 AM
-                mock_datetime.now.return_value = datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-                mock_datetime.fromisoformat = datetime.fromisoformat
-                mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
-
-                mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
-
-                detector.last_check_time[household_id] = mock_datetime.now.return_value
-
-                anomalies = await detector.check_anomalies(household_id)
-
-                # Should detect missed kitchen activity
-                kitchen_anomalies = [a for a in anomalies if a["type"] == "missed_kitchen_activity"]
-                assert len(kitchen_anomalies) > 0
-                assert kitchen_anomalies[0]["severity"] == "medium"
-
-    @pytest.mark.asyncio
-    async def test_detect_prolonged_inactivity(self, detector, sample_baseline, mock_mongodb):
-        """Test detection of prolonged inactivity"""
-        household_id = "household_001"
-        detector.household_state[household_id] = {
-            "wake_detected": True,
-            "kitchen_visited": True,
-            "first_kitchen_time": "07:00",
-            "bathroom_count": 1,
-            "last_motion_time": "2025-01-15T08:00:00",  # 3 hours ago
-            "last_location": "livingroom",
-            "door_opened": False,
-            "wake_up_time": "06:30"
-        }
-
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            with patch('app.services.anomaly_detector.datetime') as mock_datetime:
-                # Set current time to 11:30 AM (3.5 hours after last motion)
-                mock_datetime.now.return_value = datetime(2025, 1, 15, 11, 30, 0, tzinfo=timezone.utc)
-                mock_datetime.fromisoformat = datetime.fromisoformat
-
-                mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
-
-                detector.last_check_time[household_id] = mock_datetime.now.return_value
-
-                anomalies = await detector.check_anomalies(household_id)
-
-                # Should detect prolonged inactivity
-                inactivity_anomalies = [a for a in anomalies if a["type"] == "prolonged_inactivity"]
-                assert len(inactivity_anomalies) > 0
-                assert inactivity_anomalies[0]["severity"] == "high"
-
-    @pytest.mark.asyncio
-    async def test_detect_excessive_bathroom_visits(self, detector, sample_baseline, mock_mongodb):
-        """Test detection of excessive bathroom visits"""
+    @pytest.mark.parametrize("state_patch, frozen_time, expected_type, expected_severity", DETECT_CASES)
+    async def test_detect(self, detector, baselined_mongo,
+                          state_patch, frozen_time, expected_type, expected_severity):
+        """Test each anomaly rule fires with the expected severity"""
         household_id = "household_001"
-        detector.household_state[household_id] = {
-            "wake_detected": True,
-            "kitchen_visited": True,
-            "first_kitchen_time": "07:00",
-            "bathroom_count": 10,  # Excessive (baseline max is 6)
-            "last_motion_time": "2025-01-15T14:00:00",
-            "last_location": "bathroom1",
-            "door_opened": False,
-            "wake_up_time": "06:30"
-        }
-
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            with patch('app.services.anomaly_detector.datetime') as mock_datetime:
-                mock_datetime.now.return_value = datetime(2025, 1, 15, 14, 30, 0, tzinfo=timezone.utc)
-                mock_datetime.fromisoformat = datetime.fromisoformat
+        detector.household_state[household_id] = replace(_AWAKE_STATE, **state_patch)
 
-                mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
+        with freeze_time(frozen_time):
+            detector.last_check_time[household_id] = datetime.now(timezone.utc)
 
-                detector.last_check_time[household_id] = mock_datetime.now.return_value
-
-                anomalies = await detector.check_anomalies(household_id)
+            anomalies = await detector.check_anomalies(household_id)
 
-                # Should detect excessive bathroom visits
-                bathroom_anomalies = [a for a in anomalies if a["type"] == "excessive_bathroom_visits"]
-                assert len(bathroom_anomalies) > 0
-                assert bathroom_anomalies[0]["severity"] == "medium"
+        matching = [a for a in anomalies if a["type"] == expected_type]
+        assert len(matching) > 0
+        assert matching[0]["severity"] == expected_severity
 
-    @pytest.mark.asyncio
     async def test_no_baseline_skips_detection(self, detector, mock_mongodb):
         """Test that missing baseline skips anomaly detection"""
         household_id = "household_001"
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            mock_mongodb.read = AsyncMock(return_value=[])  # No baseline
+        mock_mongodb.read = _async_return([])  # No baseline
 
-            anomalies = await detector.check_anomalies(household_id)
+        anomalies = await detector.check_anomalies(household_id)
 
-            assert anomalies == []
+        assert anomalies == []
 
     # ===== Alert Title Tests =====
 
-    def test_get_alert_title_known_types(self, detector):
-        """Test alert title generation for known types"""
-        assert "Missed Breakfast" in detector._get_alert_title("missed_kitchen_activity")
-        assert "No Movement" in detector._get_alert_title("prolonged_inactivity")
-        assert "Bathroom Visits" in detector._get_alert_title("excessive_bathroom_visits")
-        assert "Wake-Up" in detector._get_alert_title("late_wake_up")
-        assert "Door Activity" in detector._get_alert_title("unusual_door_activity")
-
-    def test_get_alert_title_unknown_type(self, detector):
-        """Test alert title for unknown type"""
-        title = detector._get_alert_title("unknown_alert_type")
-        assert "Wellness Alert" in title
+    @pytest.mark.parametrize("alert_type, needle", [
+        ("missed_kitchen_activity", "Missed Breakfast"),
+        ("prolonged_inactivity", "No Movement"),
+        ("excessive_bathroom_visits", "Bathroom Visits"),
+        ("late_wake_up", "Wake-Up"),
+        ("unusual_door_activity", "Door Activity"),
+        ("unknown_alert_type", "Wellness Alert"),
+    ])
+    def test_get_alert_title(self, detector, alert_type, needle):
+        """Test alert titles for known types and the fallback for unknown ones"""
+        assert needle in detector._get_alert_title(alert_type)
 
     # ===== Integration Tests =====
 
-    @pytest.mark.asyncio
-    async def test_full_event_to_alert_flow(self, detector, sample_events_sequence,
-                                           sample_baseline, mock_mongodb):
+    async def test_full_event_to_alert_flow(self, detector, sample_events_sequence, baselined_mongo):
         """Test complete flow from events to alert generation"""
         household_id = "household_001"
 
-        with patch('app.services.anomaly_detector.MongoDB', mock_mongodb):
-            with patch('app.services.anomaly_detector.manager') as mock_manager:
-                mock_manager.send_alert = AsyncMock()
-                mock_mongodb.read = AsyncMock(return_value=[sample_baseline, []])
-                mock_mongodb.write = AsyncMock(return_value="alert_123")
+        with patch('app.services.anomaly_detector.manager') as mock_manager:
+            mock_manager.send_alert = AsyncMock()
+            baselined_mongo.write = AsyncMock(return_value="alert_123")
 
-                # Process events sequence
-                for event in sample_events_sequence:
-                    await detector.update_state_on_event(event)
+            # Process events sequence
+            for event in sample_events_sequence:
+                await detector.update_state_on_event(event)
 
-                # Verify state was built correctly
-                state = detector.household_state[household_id]
-                assert state["wake_detected"] is True
-                assert state["kitchen_visited"] is True
-                assert state["bathroom_count"] == 2
+            # Verify state was built correctly
+            state = detector.household_state[household_id]
+            assert state.wake_detected is True
+            assert state.kitchen_visited is True
+            assert state.bathroom_count == 2
 
-    @pytest.mark.asyncio
     async def test_reset_daily_state(self, detector):
         """Test manual reset of daily state"""
         detector.household_state = {
-            "household_001": {"test": "data"},
-            "household_002": {"test": "data"}
+            "household_001": HouseholdState(),
+            "household_002": HouseholdState()
         }
 
         detector.reset_daily_state()
@@ -4,9 +4,30 @@ Tests embedding generation for baseline routines using NVIDIA NIM API
 """
 import pytest
 import os
+import re
+from functools import lru_cache
 from unittest.mock import patch, Mock, MagicMock
+from app.services import nim_embedding_service
 from app.services.nim_embedding_service import NIMEmbeddingService
 
+# These tests swap the NIMEmbeddingService.client class attribute; keep them on one xdist worker
+pytestmark = pytest.mark.xdist_group("nim_service")
+
+
+@lru_cache(maxsize=None)
+def _token_pattern(tokens):
+    # Longest first so a token that is a prefix of another doesn't shadow it
+    return re.compile("|".join(re.escape(t) for t in sorted(tokens, key=len, reverse=True)))
+
+
+def assert_contains_all(text, tokens):
+    """Assert every token occurs in text, using one regex scan instead of one `in` per token"""
+    tokens = tuple(tokens)
+    found = set(_token_pattern(tokens).findall(text))
+    # findall doesn't report overlapping matches; confirm any stragglers directly
+    missing = [t for t in tokens if t not in found and t not in text]
+    assert not missing, f"missing {sorted(missing)} in {text!r}"
+
 
 class TestNIMEmbeddingServiceInitialization:
     """Test NIM Embedding Service initialization"""
@@ -28,7 +49,8 @@ class TestNIMEmbeddingServiceInitialization:
         mock_embeddings.assert_called_once_with(
             model="test-model",
             api_key="test_key",
-            truncate="NONE"
+            truncate="NONE",
+            max_batch_size=nim_embedding_service.EMBED_BATCH_SIZE
         )
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"}, clear=True)
@@ -45,7 +67,8 @@ class TestNIMEmbeddingServiceInitialization:
         mock_embeddings.assert_called_once_with(
             model="nvidia/nv-embedqa-e5-v5",
             api_key="test_key",
-            truncate="NONE"
+            truncate="NONE",
+            max_batch_size=nim_embedding_service.EMBED_BATCH_SIZE
         )
 
     @patch.dict(os.environ, {}, clear=True)
@@ -71,104 +94,80 @@ class TestNIMEmbeddingServiceInitialization:
 class TestNIMEmbeddingServiceEmbedQuery:
     """Test embedding generation for single queries"""
 
-    def test_embed_query_without_initialization(self):
+    def test_embed_query_without_initialization(self, nim_uninitialized):
         """Test that calling embed_query without initialization raises error"""
-        # Reset client
-        NIMEmbeddingService.client = None
-
         with pytest.raises(RuntimeError) as exc_info:
             NIMEmbeddingService.embed_query("test text")
 
         assert "not initialized" in str(exc_info.value)
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_query_success(self):
+    def test_embed_query_success(self, nim_client):
         """Test successful query embedding"""
-        # Mock client
-        mock_client = Mock()
-        mock_client.embed_query.return_value = [0.1, 0.2, 0.3, 0.4]
-        NIMEmbeddingService.client = mock_client
+        nim_client.embed_query.return_value = [0.1, 0.2, 0.3, 0.4]
 
         result = NIMEmbeddingService.embed_query("test text")
 
-        mock_client.embed_query.assert_called_once_with("test text")
+        nim_client.embed_query.assert_called_once_with("test text")
         assert result == [0.1, 0.2, 0.3, 0.4]
         assert isinstance(result, list)
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_query_empty_string(self):
+    def test_embed_query_empty_string(self, nim_client):
         """Test embedding empty string"""
-        mock_client = Mock()
-        mock_client.embed_query.return_value = [0.0] * 1024
-        NIMEmbeddingService.client = mock_client
+        nim_client.embed_query.return_value = [0.0] * 1024
 
         result = NIMEmbeddingService.embed_query("")
 
-        mock_client.embed_query.assert_called_once_with("")
+        nim_client.embed_query.assert_called_once_with("")
         assert len(result) == 1024
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_query_long_text(self):
+    def test_embed_query_long_text(self, nim_client):
         """Test embedding long text"""
-        mock_client = Mock()
-        mock_client.embed_query.return_value = [0.5] * 1024
-        NIMEmbeddingService.client = mock_client
+        nim_client.embed_query.return_value = [0.5] * 1024
 
         long_text = "test " * 1000
         result = NIMEmbeddingService.embed_query(long_text)
 
-        mock_client.embed_query.assert_called_once_with(long_text)
+        nim_client.embed_query.assert_called_once_with(long_text)
         assert isinstance(result, list)
 
 
 class TestNIMEmbeddingServiceEmbedDocuments:
     """Test embedding generation for multiple documents"""
 
-    def test_embed_documents_without_initialization(self):
+    def test_embed_documents_without_initialization(self, nim_uninitialized):
         """Test that calling embed_documents without initialization raises error"""
-        NIMEmbeddingService.client = None
-
         with pytest.raises(RuntimeError) as exc_info:
             NIMEmbeddingService.embed_documents(["text1", "text2"])
 
         assert "not initialized" in str(exc_info.value)
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_documents_success(self):
+    def test_embed_documents_success(self, nim_client):
         """Test successful document embeddings"""
-        mock_client = Mock()
-        mock_client.embed_documents.return_value = [
+        nim_client.embed_documents.return_value = [
             [0.1, 0.2, 0.3],
             [0.4, 0.5, 0.6]
         ]
-        NIMEmbeddingService.client = mock_client
 
         texts = ["text1", "text2"]
         result = NIMEmbeddingService.embed_documents(texts)
 
-        mock_client.embed_documents.assert_called_once_with(texts)
+        nim_client.embed_documents.assert_called_once_with(texts)
         assert len(result) == 2
         assert result[0] == [0.1, 0.2, 0.3]
         assert result[1] == [0.4, 0.5, 0.6]
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_documents_empty_list(self):
+    def test_embed_documents_empty_list(self, nim_client):
         """Test embedding empty list of documents"""
-        mock_client = Mock()
-        mock_client.embed_documents.return_value = []
-        NIMEmbeddingService.client = mock_client
+        nim_client.embed_documents.return_value = []
 
         result = NIMEmbeddingService.embed_documents([])
 
-        mock_client.embed_documents.assert_called_once_with([])
+        nim_client.embed_documents.assert_not_called()
         assert result == []
 
-    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    def test_embed_documents_single_document(self):
+    def test_embed_documents_single_document(self, nim_client):
         """Test embedding single document in list"""
-        mock_client = Mock()
-        mock_client.embed_documents.return_value = [[0.1, 0.2, 0.3]]
-        NIMEmbeddingService.client = mock_client
+        nim_client.embed_documents.return_value = [[0.1, 0.2, 0.3]]
 
         result = NIMEmbeddingService.embed_documents(["single text"])
 
@@ -230,18 +229,10 @@ class TestFormatBaselineRoutine:
         text = NIMEmbeddingService.format_baseline_routine_for_embedding(baseline)
 
         # Check all key information is included
-        assert "household_001" in text
-        assert "7 days" in text
-        assert "2025-01-08" in text
-        assert "2025-01-15" in text
-        assert "06:30" in text
-        assert "22:00" in text
-        assert "07:00" in text
-        assert "06:35" in text
-        assert "4.5" in text
-        assert "900" in text
-        assert "127.5" in text
-        assert "reliability: 1.0" in text
+        assert_contains_all(text, (
+            "household_001", "7 days", "2025-01-08", "2025-01-15", "06:30", "22:00",
+            "07:00", "06:35", "4.5", "900", "127.5", "reliability: 1.0"
+        ))
 
         # Check it's properly formatted
         assert text.endswith(".")
@@ -342,8 +333,7 @@ class TestFormatBaselineRoutine:
         assert len(sentences) >= 2
         assert text.endswith(".")
         # First sentence should be about household and period
-        assert "Household" in sentences[0]
-        assert "baseline summary" in sentences[0]
+        assert_contains_all(sentences[0], ("Household", "baseline summary"))
 
 
 class TestNIMEmbeddingServiceIntegration:
@@ -379,3 +369,31 @@ class TestNIMEmbeddingServiceIntegration:
         assert isinstance(embedding, list)
         assert len(embedding) == 1024
         mock_client.embed_query.assert_called_once_with(text)
+
+
+@pytest.mark.benchmark
+class TestFormatBaselineBenchmark:
+    """Latency benchmarks for baseline formatting (run with: pytest -m benchmark -n 0)"""
+
+    def test_bench_format_baseline(self, benchmark):
+        """Formatting a baseline takes well under 1 ms (median)"""
+        baseline = {
+            "household_id": "household_001",
+            "baseline_period": {"days": 7, "start_date": "2025-01-08", "end_date": "2025-01-15"},
+            "wake_up_time": {"median": "06:30"},
+            "bed_time": {"median": "22:00"},
+            "first_kitchen_time": {"median": "07:00"},
+            "bathroom_first_time": {"median": "06:35"},
+            "bathroom_visits": {"daily_avg": 6.5, "daily_median": 6, "min_daily": 4, "max_daily": 9},
+            "activity_duration": {"median_minutes": 900, "earliest_start": "06:00", "latest_end": "22:30"},
+            "total_daily_events": {"avg": 120, "median": 118, "min": 90, "max": 150},
+            "data_quality": {"days_with_complete_data": 7, "days_with_missing_wake": 0,
+                             "days_with_missing_kitchen": 0, "reliability_score": 1.0}
+        }
+
+        text = benchmark.pedantic(NIMEmbeddingService.format_baseline_routine_for_embedding,
+                                  args=(baseline,), rounds=50, warmup_rounds=5)
+
+        assert text.startswith("Household household_001")
+        # Median, not max: one slow round (GC, scheduler noise) mustn't fail the benchmark
+        assert benchmark.stats.stats.median < 1e-3
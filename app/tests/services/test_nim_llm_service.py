@@ -4,11 +4,22 @@ Tests LLM integration for generating routine summaries using NVIDIA NIM API
 """
 import pytest
 import os
-from unittest.mock import patch, Mock, MagicMock
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
 import requests
+import httpx
+import json
+from app.services import nim_llm_service
 from app.services.nim_llm_service import NIMLLMService
 
 
+@pytest.fixture(autouse=True)
+def clear_summary_cache():
+    """Start each test with empty prompt/summary caches so API calls aren't skipped"""
+    nim_llm_service._SUMMARY_CACHE.clear()
+    nim_llm_service._prompt_from_key.cache_clear()
+    yield
+
+
 class TestNIMLLMService:
     """Test NIM LLM Service functionality"""
 
@@ -27,7 +38,8 @@ class TestNIMLLMService:
         assert isinstance(prompt, str)
         assert "daily routine record" in prompt.lower()
         assert "summarize" in prompt.lower()
-        assert str(routine) in prompt
+        assert '"wake_up_time":"07:30"' in prompt
+        assert json.dumps(routine, separators=(",", ":"), sort_keys=True) in prompt
         assert "Summary:" in prompt
 
     def test_build_llama3_prompt_empty_routine(self):
@@ -52,12 +64,12 @@ class TestNIMLLMService:
         assert "reasons" in prompt.lower()
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_api_key_12345"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_success(self, mock_post):
         """Test successful LLM API call"""
         # Mock successful API response
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [
                 {
                     "message": {
@@ -65,7 +77,7 @@ class TestNIMLLMService:
                     }
                 }
             ]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -91,7 +103,7 @@ class TestNIMLLMService:
         assert headers["Content-Type"] == "application/json"
 
         # Check request data
-        data = call_args[1]["json"]
+        data = json.loads(call_args[1]["data"])
         assert data["model"] == "meta/llama-3.1-8b-instruct"
         assert "messages" in data
         assert len(data["messages"]) == 1
@@ -115,7 +127,7 @@ class TestNIMLLMService:
         assert "NIM_API_KEY" in str(exc_info.value)
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_api_error(self, mock_post):
         """Test handling of API errors"""
         # Mock API error
@@ -127,7 +139,7 @@ class TestNIMLLMService:
             NIMLLMService.get_llama3_summary(routine)
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_http_error(self, mock_post):
         """Test handling of HTTP errors (4xx, 5xx)"""
         # Mock HTTP error response
@@ -141,7 +153,40 @@ class TestNIMLLMService:
             NIMLLMService.get_llama3_summary(routine)
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service.time.sleep')
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_retries_on_429(self, mock_post, mock_sleep):
+        """Test that 429 responses are retried with backoff until one succeeds"""
+        throttled = Mock(status_code=429, headers={"Retry-After": "1"})
+        ok = Mock(status_code=200, headers={})
+        ok.content = json.dumps({"choices": [{"message": {"content": "Summary after retry"}}]}).encode()
+        mock_post.side_effect = [throttled, throttled, ok]
+
+        summary = NIMLLMService.get_llama3_summary({"wake_up_time": "07:30"})
+
+        assert summary == "Summary after retry"
+        assert mock_post.call_count == 3
+        # Retry-After is honoured
+        assert [c[0][0] for c in mock_sleep.call_args_list] == [1.0, 1.0]
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service.time.sleep')
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_retry_gives_up(self, mock_post, mock_sleep):
+        """Test that a persistent 5xx is retried MAX_RETRIES times, then raised"""
+        unavailable = Mock(status_code=503, headers={})
+        unavailable.raise_for_status.side_effect = requests.exceptions.HTTPError("503 Service Unavailable")
+        mock_post.return_value = unavailable
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            NIMLLMService.get_llama3_summary({"wake_up_time": "07:30"})
+
+        assert mock_post.call_count == nim_llm_service.MAX_RETRIES + 1
+        delays = [c[0][0] for c in mock_sleep.call_args_list]
+        assert all(0 <= d <= nim_llm_service.RETRY_MAX_BACKOFF_SECONDS for d in delays)
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_timeout(self, mock_post):
         """Test handling of timeout errors"""
         mock_post.side_effect = requests.exceptions.Timeout("Request timeout")
@@ -152,12 +197,12 @@ class TestNIMLLMService:
             NIMLLMService.get_llama3_summary(routine)
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_malformed_response(self, mock_post):
         """Test handling of malformed API response"""
         # Mock malformed response
         mock_response = Mock()
-        mock_response.json.return_value = {"error": "invalid"}
+        mock_response.content = json.dumps({"error": "invalid"}).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -167,11 +212,11 @@ class TestNIMLLMService:
             NIMLLMService.get_llama3_summary(routine)
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_strips_whitespace(self, mock_post):
         """Test that response content is stripped of whitespace"""
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [
                 {
                     "message": {
@@ -179,7 +224,7 @@ class TestNIMLLMService:
                     }
                 }
             ]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -191,11 +236,11 @@ class TestNIMLLMService:
         assert not summary.endswith(" ")
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_complete_routine(self, mock_post):
         """Test with a complete routine dictionary"""
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [
                 {
                     "message": {
@@ -203,7 +248,7 @@ class TestNIMLLMService:
                     }
                 }
             ]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -222,7 +267,7 @@ class TestNIMLLMService:
 
         # Verify the prompt includes all routine data
         call_args = mock_post.call_args
-        prompt = call_args[1]["json"]["messages"][0]["content"]
+        prompt = json.loads(call_args[1]["data"])["messages"][0]["content"]
         assert "06:30" in prompt
         assert "22:00" in prompt
         assert "127" in prompt
@@ -231,13 +276,13 @@ class TestNIMLLMService:
         assert len(summary) > 0
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_request_timeout_parameter(self, mock_post):
         """Test that timeout parameter is set correctly"""
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [{"message": {"content": "Test summary"}}]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -249,13 +294,13 @@ class TestNIMLLMService:
         assert call_args[1]["timeout"] == 30
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_get_llama3_summary_stream_disabled(self, mock_post):
         """Test that streaming is disabled in the request"""
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [{"message": {"content": "Test summary"}}]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -264,9 +309,216 @@ class TestNIMLLMService:
 
         # Verify stream is False
         call_args = mock_post.call_args
-        data = call_args[1]["json"]
+        data = json.loads(call_args[1]["data"])
         assert data["stream"] is False
 
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summaries_parallel(self, mock_post):
+        """Test batch summaries make one call per routine and keep input order"""
+        def respond(url, headers, data, timeout):
+            # Echo the routine's marker back so ordering can be checked
+            prompt = json.loads(data)["messages"][-1]["content"]
+            marker = next(f"day_{i}" for i in range(10) if f"day_{i}" in prompt)
+            mock_response = Mock()
+            mock_response.content = json.dumps({"choices": [{"message": {"content": marker}}]}).encode()
+            return mock_response
+
+        mock_post.side_effect = respond
+        routines = [{"date": f"day_{i}"} for i in range(10)]
+
+        summaries = NIMLLMService.get_llama3_summaries(routines, max_concurrency=4)
+
+        assert summaries == [f"day_{i}" for i in range(10)]
+        assert mock_post.call_count == len(routines)
+
+    def test_get_llama3_summaries_empty(self):
+        """Test batch summaries with no routines makes no calls"""
+        assert NIMLLMService.get_llama3_summaries([]) == []
+
+    def test_get_llama3_summaries_invalid_concurrency(self):
+        """Test batch summaries reject a non-positive concurrency"""
+        with pytest.raises(ValueError):
+            NIMLLMService.get_llama3_summaries([{"wake_up_time": "07:30"}], max_concurrency=0)
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_cache_hit_skips_api(self, mock_post):
+        """Test that summarizing the same routine twice calls the API once"""
+        mock_response = Mock()
+        mock_response.content = json.dumps({"choices": [{"message": {"content": "Normal day."}}]}).encode()
+        mock_post.return_value = mock_response
+
+        first = NIMLLMService.get_llama3_summary({"wake_up_time": "07:30", "bed_time": "22:00"})
+        # Same routine with a different key order hits the cache
+        second = NIMLLMService.get_llama3_summary({"bed_time": "22:00", "wake_up_time": "07:30"})
+
+        assert first == second == "Normal day."
+        assert mock_post.call_count == 1
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_cache_is_bounded(self, mock_post, monkeypatch):
+        """Test that the summary cache evicts the least recently used routine"""
+        monkeypatch.setattr(nim_llm_service, "SUMMARY_CACHE_SIZE", 2)
+        mock_response = Mock()
+        mock_response.content = json.dumps({"choices": [{"message": {"content": "Summary"}}]}).encode()
+        mock_post.return_value = mock_response
+
+        for day in ("mon", "tue", "wed"):
+            NIMLLMService.get_llama3_summary({"day": day})
+
+        assert len(nim_llm_service._SUMMARY_CACHE) == 2
+        NIMLLMService.get_llama3_summary({"day": "mon"})
+        assert mock_post.call_count == 4
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_iter_llama3_summary_yields_chunks(self, mock_post):
+        """Test that streamed SSE frames are yielded as content chunks"""
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.return_value = [
+            b'data: {"choices":[{"delta":{"role":"assistant"}}]}',
+            b'data: {"choices":[{"delta":{"content":"Normal "}}]}',
+            b'',
+            b'data: {"choices":[{"delta":{"content":"morning."}}]}',
+            b'data: [DONE]',
+        ]
+        mock_post.return_value = mock_response
+
+        chunks = list(NIMLLMService.iter_llama3_summary({"wake_up_time": "07:30"}))
+
+        assert chunks == ["Normal ", "morning."]
+        call_args = mock_post.call_args
+        assert call_args[1]["stream"] is True
+        assert json.loads(call_args[1]["data"])["stream"] is True
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_iter_llama3_summary_no_api_key(self):
+        """Test that streaming without an API key raises on first iteration"""
+        with pytest.raises(KeyError):
+            next(NIMLLMService.iter_llama3_summary({"wake_up_time": "07:30"}))
+
+    @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_accepts_compression(self, mock_post):
+        """Test that requests ask for a gzip-compressed response"""
+        mock_response = Mock()
+        mock_response.content = json.dumps({"choices": [{"message": {"content": "Summary"}}]}).encode()
+        mock_post.return_value = mock_response
+
+        NIMLLMService.get_llama3_summary({"wake_up_time": "07:30"})
+
+        headers = mock_post.call_args[1]["headers"]
+        assert "gzip" in headers["Accept-Encoding"]
+
+    def test_async_client_uses_http2(self, monkeypatch):
+        """Test that the shared async client is built with HTTP/2 enabled"""
+        monkeypatch.setattr(nim_llm_service, "_ASYNC_CLIENT", None)
+        with patch('app.services.nim_llm_service.httpx.AsyncClient') as mock_client:
+            nim_llm_service._get_async_client()
+        assert mock_client.call_args[1]["http2"] is True
+
+    def test_auth_headers_memoized(self, monkeypatch):
+        """Test that auth headers are built once per API key and rebuilt when it changes"""
+        monkeypatch.setenv("NIM_API_KEY", "key_one")
+        first = nim_llm_service._get_auth_headers()
+        assert nim_llm_service._get_auth_headers() is first
+        assert first["Authorization"] == "Bearer key_one"
+
+        monkeypatch.setenv("NIM_API_KEY", "key_two")
+        second = nim_llm_service._get_auth_headers()
+        assert second is not first
+        assert second["Authorization"] == "Bearer key_two"
+
+        monkeypatch.delenv("NIM_API_KEY")
+        with pytest.raises(KeyError):
+            nim_llm_service._get_auth_headers()
+
+
+@pytest.fixture
+async def async_nim(monkeypatch):
+    """Route the async client through a mock transport; yields (captured requests, response settings)"""
+    requests_seen = []
+    responses = {"status": 200, "content": "Async summary."}
+
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(
+            responses["status"],
+            json={"choices": [{"message": {"content": responses["content"]}}]}
+        )
+
+    monkeypatch.setenv("NIM_API_KEY", "test_key")
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(nim_llm_service, "_ASYNC_CLIENT", client)
+    yield requests_seen, responses
+    # Close it like close_http does in production (a no-op if the test already closed it)
+    await client.aclose()
+
+
+class TestNIMLLMServiceAsync:
+    """Test the httpx-based async API"""
+
+    async def test_aget_llama3_summary_success(self, async_nim):
+        """Test async summary posts the chat payload and returns the stripped content"""
+        requests_seen, _ = async_nim
+
+        summary = await NIMLLMService.aget_llama3_summary({"wake_up_time": "07:30"})
+
+        assert summary == "Async summary."
+        assert len(requests_seen) == 1
+        request = requests_seen[0]
+        assert str(request.url) == NIMLLMService.LLAMA3_ENDPOINT
+        assert request.headers["Authorization"] == "Bearer test_key"
+        body = json.loads(request.content)
+        assert body["max_tokens"] == 128
+        assert '"wake_up_time":"07:30"' in body["messages"][-1]["content"]
+
+    async def test_aget_llama3_summary_shares_cache(self, async_nim):
+        """Test async summaries use the same cache as the sync path"""
+        requests_seen, _ = async_nim
+
+        await NIMLLMService.aget_llama3_summary({"wake_up_time": "07:30"})
+        await NIMLLMService.aget_llama3_summary({"wake_up_time": "07:30"})
+
+        assert len(requests_seen) == 1
+        assert NIMLLMService.get_llama3_summary({"wake_up_time": "07:30"}) == "Async summary."
+
+    async def test_aget_llama3_summary_http_error(self, async_nim):
+        """Test async summary raises on a non-retryable error status"""
+        requests_seen, responses = async_nim
+        responses["status"] = 401
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await NIMLLMService.aget_llama3_summary({"wake_up_time": "07:30"})
+        assert len(requests_seen) == 1
+
+    async def test_aget_llama3_summary_retries_then_raises(self, async_nim, monkeypatch):
+        """Test async summary retries a 5xx MAX_RETRIES times before raising"""
+        sleep = AsyncMock()
+        monkeypatch.setattr(nim_llm_service, "_sleep", sleep)
+        requests_seen, responses = async_nim
+        responses["status"] = 503
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await NIMLLMService.aget_llama3_summary({"wake_up_time": "07:30"})
+        assert len(requests_seen) == nim_llm_service.MAX_RETRIES + 1
+        assert sleep.await_count == nim_llm_service.MAX_RETRIES
+
+    async def test_configure_http_rebuilds_client(self, async_nim, monkeypatch):
+        """Test configure_http closes the current client and applies new limits on next use"""
+        monkeypatch.setattr(nim_llm_service, "_HTTP_LIMITS", nim_llm_service._HTTP_LIMITS)
+        old_client = nim_llm_service._ASYNC_CLIENT
+
+        await nim_llm_service.configure_http(max_connections=10, max_keepalive=5)
+
+        assert old_client.is_closed
+        assert nim_llm_service._ASYNC_CLIENT is None
+        assert nim_llm_service._HTTP_LIMITS.max_connections == 10
+        assert nim_llm_service._HTTP_LIMITS.max_keepalive_connections == 5
+
 
 class TestNIMLLMServiceEdgeCases:
     """Test edge cases and unusual inputs"""
@@ -279,9 +531,21 @@ class TestNIMLLMServiceEdgeCases:
             "total_events": None
         }
 
-        prompt = NIMLLMService.build_llama3_prompt(routine)
+        prompt = NIMLLMService.build_llama3_prompt(routine, drop_none=False)
         assert isinstance(prompt, str)
-        assert "None" in prompt
+        assert '"wake_up_time":null' in prompt
+
+    def test_build_prompt_drops_none_values_by_default(self):
+        """Test that None fields are left out of the prompt by default"""
+        routine = {
+            "wake_up_time": None,
+            "bed_time": "22:00",
+            "total_events": None
+        }
+
+        prompt = NIMLLMService.build_llama3_prompt(routine)
+        assert '{"bed_time":"22:00"}' in prompt
+        assert "wake_up_time" not in prompt
 
     def test_build_prompt_with_very_large_routine(self):
         """Test with a routine containing many fields"""
@@ -292,13 +556,13 @@ class TestNIMLLMServiceEdgeCases:
         assert len(prompt) > 100
 
     @patch.dict(os.environ, {"NIM_API_KEY": "test_key"})
-    @patch('app.services.nim_llm_service.requests.post')
+    @patch('app.services.nim_llm_service._SESSION.post')
     def test_empty_response_content(self, mock_post):
         """Test handling of empty content in response"""
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [{"message": {"content": "   "}}]
-        }
+        }).encode()
         mock_response.raise_for_status = Mock()
         mock_post.return_value = mock_response
 
@@ -306,3 +570,18 @@ class TestNIMLLMServiceEdgeCases:
         summary = NIMLLMService.get_llama3_summary(routine)
 
         assert summary == ""
+
+    @patch('app.services.nim_llm_service._SESSION.post')
+    def test_get_llama3_summary_empty_routine_skips_api(self, mock_post):
+        """Test that empty or all-None routines return the canned summary without an API call"""
+        assert NIMLLMService.get_llama3_summary({}) == NIMLLMService.EMPTY_ROUTINE_SUMMARY
+        assert NIMLLMService.get_llama3_summary(
+            {"wake_up_time": None, "bed_time": "", "events": []}
+        ) == NIMLLMService.EMPTY_ROUTINE_SUMMARY
+        # What extract_routine returns for a day with no events: zero counts are still no activity
+        assert NIMLLMService.get_llama3_summary({
+            "wake_up_time": None, "bed_time": None, "first_kitchen_time": None, "bathroom_first_time": None,
+            "total_bathroom_events": 0, "activity_start": None, "activity_end": None, "total_events": 0
+        }) == NIMLLMService.EMPTY_ROUTINE_SUMMARY
+        assert list(NIMLLMService.iter_llama3_summary({})) == [NIMLLMService.EMPTY_ROUTINE_SUMMARY]
+        mock_post.assert_not_called()
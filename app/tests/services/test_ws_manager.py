@@ -2,11 +2,40 @@
 Tests for WebSocket Connection Manager
 Tests WebSocket connection management, alert distribution, and error handling
 """
+import asyncio
+import time
+import orjson
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from app.services.ws_manager import ConnectionManager, manager
 
 
+class FakeWebSocket:
+    """Minimal WebSocket stand-in, far cheaper to build than a MagicMock/AsyncMock tree per socket"""
+    __slots__ = ("accepted", "sent")
+
+    def __init__(self):
+        self.accepted = 0
+        self.sent = []
+
+    async def accept(self):
+        self.accepted += 1
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+class FailingWebSocket(FakeWebSocket):
+    """FakeWebSocket whose sends always fail"""
+    __slots__ = ()
+
+    async def send_text(self, message):
+        raise ConnectionError("Connection lost")
+
+
 class TestConnectionManager:
     """Test suite for ConnectionManager class"""
 
@@ -17,13 +46,8 @@ class TestConnectionManager:
 
     @pytest.fixture
     def mock_websocket(self):
-        """Create a mock WebSocket connection"""
-        ws = MagicMock()
-        ws.accept = AsyncMock()
-        ws.send_json = AsyncMock()
-        ws.send_text = AsyncMock()
-        ws.close = AsyncMock()
-        return ws
+        """Create a fake WebSocket connection"""
+        return FakeWebSocket()
 
     # ===== Initialization Tests =====
 
@@ -34,7 +58,6 @@ class TestConnectionManager:
 
     # ===== Connection Management Tests =====
 
-    @pytest.mark.asyncio
     async def test_connect_new_household(self, conn_manager, mock_websocket):
         """Test connecting first WebSocket for a household"""
         household_id = "household_001"
@@ -44,15 +67,13 @@ class TestConnectionManager:
         assert household_id in conn_manager.active_connections
         assert mock_websocket in conn_manager.active_connections[household_id]
         assert len(conn_manager.active_connections[household_id]) == 1
-        mock_websocket.accept.assert_called_once()
+        assert mock_websocket.accepted == 1
 
-    @pytest.mark.asyncio
     async def test_connect_multiple_clients_same_household(self, conn_manager, mock_websocket):
         """Test connecting multiple clients to same household"""
         household_id = "household_001"
         ws1 = mock_websocket
-        ws2 = MagicMock()
-        ws2.accept = AsyncMock()
+        ws2 = FakeWebSocket()
 
         await conn_manager.connect(ws1, household_id)
         await conn_manager.connect(ws2, household_id)
@@ -61,12 +82,10 @@ class TestConnectionManager:
         assert ws1 in conn_manager.active_connections[household_id]
         assert ws2 in conn_manager.active_connections[household_id]
 
-    @pytest.mark.asyncio
     async def test_connect_different_households(self, conn_manager, mock_websocket):
         """Test connecting clients to different households"""
         ws1 = mock_websocket
-        ws2 = MagicMock()
-        ws2.accept = AsyncMock()
+        ws2 = FakeWebSocket()
 
         await conn_manager.connect(ws1, "household_001")
         await conn_manager.connect(ws2, "household_002")
@@ -77,7 +96,6 @@ class TestConnectionManager:
 
     # ===== Disconnection Tests =====
 
-    @pytest.mark.asyncio
     async def test_disconnect_existing_connection(self, conn_manager, mock_websocket):
         """Test disconnecting an existing WebSocket"""
         household_id = "household_001"
@@ -85,18 +103,14 @@ class TestConnectionManager:
 
         conn_manager.disconnect(mock_websocket, household_id)
 
-        assert household_id in conn_manager.active_connections
-        assert mock_websocket not in conn_manager.active_connections[household_id]
-        assert len(conn_manager.active_connections[household_id]) == 0
+        # The now-empty connection set is dropped along with the last socket
+        assert household_id not in conn_manager.active_connections
 
-    @pytest.mark.asyncio
     async def test_disconnect_one_of_multiple_connections(self, conn_manager):
         """Test disconnecting one client when multiple are connected"""
         household_id = "household_001"
-        ws1 = MagicMock()
-        ws1.accept = AsyncMock()
-        ws2 = MagicMock()
-        ws2.accept = AsyncMock()
+        ws1 = FakeWebSocket()
+        ws2 = FakeWebSocket()
 
         await conn_manager.connect(ws1, household_id)
         await conn_manager.connect(ws2, household_id)
@@ -113,9 +127,23 @@ class TestConnectionManager:
         conn_manager.disconnect(mock_websocket, "nonexistent_household")
         assert True  # If we get here, no exception was raised
 
+    async def test_connection_count(self, conn_manager):
+        """Test connection_count follows connects/disconnects without adding entries for unknown households"""
+        household_id = "household_001"
+        ws1, ws2 = FakeWebSocket(), FakeWebSocket()
+
+        assert conn_manager.connection_count(household_id) == 0
+        await conn_manager.connect(ws1, household_id)
+        await conn_manager.connect(ws2, household_id)
+        assert conn_manager.connection_count(household_id) == 2
+
+        conn_manager.disconnect(ws1, household_id)
+        conn_manager.disconnect(ws2, household_id)
+        assert conn_manager.connection_count(household_id) == 0
+        assert household_id not in conn_manager.active_connections
+
     # ===== Alert Sending Tests =====
 
-    @pytest.mark.asyncio
     async def test_send_alert_to_single_connection(self, conn_manager, mock_websocket):
         """Test sending alert to a single connected client"""
         household_id = "household_001"
@@ -128,18 +156,13 @@ class TestConnectionManager:
         await conn_manager.connect(mock_websocket, household_id)
         await conn_manager.send_alert(household_id, alert_message)
 
-        mock_websocket.send_json.assert_called_once_with(alert_message)
+        assert mock_websocket.sent == [orjson.dumps(alert_message).decode()]
 
-    @pytest.mark.asyncio
     async def test_send_alert_to_multiple_connections(self, conn_manager):
         """Test broadcasting alert to multiple connected clients"""
         household_id = "household_001"
-        ws1 = MagicMock()
-        ws1.accept = AsyncMock()
-        ws1.send_json = AsyncMock()
-        ws2 = MagicMock()
-        ws2.accept = AsyncMock()
-        ws2.send_json = AsyncMock()
+        ws1 = FakeWebSocket()
+        ws2 = FakeWebSocket()
 
         alert_message = {"type": "test_alert", "message": "Test"}
 
@@ -147,10 +170,31 @@ class TestConnectionManager:
         await conn_manager.connect(ws2, household_id)
         await conn_manager.send_alert(household_id, alert_message)
 
-        ws1.send_json.assert_called_once_with(alert_message)
-        ws2.send_json.assert_called_once_with(alert_message)
+        assert ws1.sent == [orjson.dumps(alert_message).decode()]
+        assert ws2.sent == [orjson.dumps(alert_message).decode()]
+
+    async def test_send_alert_fans_out_concurrently(self, conn_manager):
+        """Test a broadcast to many slow sockets takes about one send, not one per socket"""
+        household_id = "household_001"
+
+        async def slow_send(payload):
+            await asyncio.sleep(0.05)
+
+        sockets = []
+        for _ in range(100):
+            ws = MagicMock()
+            ws.send_text = AsyncMock(side_effect=slow_send)
+            conn_manager.add_connection(ws, household_id)
+            sockets.append(ws)
+
+        start = time.perf_counter()
+        await conn_manager.send_alert(household_id, {"type": "test_alert"})
+        elapsed = time.perf_counter() - start
+
+        # Sequential sends would take ~5s
+        assert elapsed < 0.5
+        assert all(ws.send_text.call_count == 1 for ws in sockets)
 
-    @pytest.mark.asyncio
     async def test_send_alert_no_connections(self, conn_manager, capsys):
         """Test sending alert when no connections exist"""
         household_id = "household_001"
@@ -162,25 +206,38 @@ class TestConnectionManager:
         # Check that warning was printed (optional)
         # Note: This might not work in all test environments
 
-    @pytest.mark.asyncio
+    async def test_send_alert_unknown_household_adds_no_entry(self, conn_manager):
+        """Test alerts for households without listeners don't create empty sets in the defaultdict"""
+        await conn_manager.send_alert("household_001", {"type": "test"})
+
+        assert "household_001" not in conn_manager.active_connections
+
     async def test_send_alert_empty_connection_list(self, conn_manager):
         """Test sending alert to household with empty connection list"""
         household_id = "household_001"
-        conn_manager.active_connections[household_id] = []
+        conn_manager.active_connections[household_id] = set()
         alert_message = {"type": "test", "message": "test"}
 
         # Should handle gracefully
         await conn_manager.send_alert(household_id, alert_message)
 
+    async def test_warning_count_is_bounded(self, conn_manager):
+        """Test no-listener bookkeeping evicts the oldest households past its cap"""
+        conn_manager._warning_count.maxsize = 3
+        for i in range(5):
+            await conn_manager.send_alert(f"household_{i:03d}", {"type": "test"})
+        await conn_manager.send_alert("household_004", {"type": "test"})
+
+        assert list(conn_manager._warning_count) == ["household_002", "household_003", "household_004"]
+        assert conn_manager._warning_count["household_004"] == 2
+        assert conn_manager._warning_count["household_000"] == 0
+
     # ===== Error Handling Tests =====
 
-    @pytest.mark.asyncio
     async def test_send_alert_connection_fails(self, conn_manager):
         """Test sending alert when connection fails"""
         household_id = "household_001"
-        ws = MagicMock()
-        ws.accept = AsyncMock()
-        ws.send_json = AsyncMock(side_effect=Exception("Connection lost"))
+        ws = FailingWebSocket()
 
         alert_message = {"type": "test", "message": "test"}
 
@@ -190,17 +247,12 @@ class TestConnectionManager:
         # Dead connection should be removed
         assert ws not in conn_manager.active_connections.get(household_id, [])
 
-    @pytest.mark.asyncio
     async def test_send_alert_partial_failure(self, conn_manager):
         """Test sending alert when some connections fail"""
         household_id = "household_001"
-        ws_good = MagicMock()
-        ws_good.accept = AsyncMock()
-        ws_good.send_json = AsyncMock()
+        ws_good = FakeWebSocket()
 
-        ws_bad = MagicMock()
-        ws_bad.accept = AsyncMock()
-        ws_bad.send_json = AsyncMock(side_effect=Exception("Connection lost"))
+        ws_bad = FailingWebSocket()
 
         alert_message = {"type": "test", "message": "test"}
 
@@ -213,15 +265,12 @@ class TestConnectionManager:
         # Bad connection should be removed
         assert ws_bad not in conn_manager.active_connections[household_id]
         # Good connection should have received the alert
-        ws_good.send_json.assert_called_once_with(alert_message)
+        assert ws_good.sent == [orjson.dumps(alert_message).decode()]
 
-    @pytest.mark.asyncio
     async def test_send_alert_all_connections_fail(self, conn_manager):
         """Test when all connections fail, household is cleaned up"""
         household_id = "household_001"
-        ws = MagicMock()
-        ws.accept = AsyncMock()
-        ws.send_json = AsyncMock(side_effect=Exception("Connection lost"))
+        ws = FailingWebSocket()
 
         alert_message = {"type": "test", "message": "test"}
 
@@ -241,7 +290,6 @@ class TestConnectionManager:
 
     # ===== Edge Cases =====
 
-    @pytest.mark.asyncio
     async def test_connect_same_websocket_twice(self, conn_manager, mock_websocket):
         """Test connecting the same WebSocket twice to same household"""
         household_id = "household_001"
@@ -249,10 +297,9 @@ class TestConnectionManager:
         await conn_manager.connect(mock_websocket, household_id)
         await conn_manager.connect(mock_websocket, household_id)
 
-        # Should have two references (Python allows duplicate list items)
-        assert conn_manager.active_connections[household_id].count(mock_websocket) == 2
+        # Connections are stored in a set, so the duplicate add is a no-op
+        assert len(conn_manager.active_connections[household_id]) == 1
 
-    @pytest.mark.asyncio
     async def test_disconnect_already_disconnected(self, conn_manager, mock_websocket):
         """Test disconnecting a WebSocket that's already disconnected"""
         household_id = "household_001"
@@ -260,28 +307,21 @@ class TestConnectionManager:
         conn_manager.disconnect(mock_websocket, household_id)
 
         # Try disconnecting again - should not raise exception
-        # Note: This will raise ValueError if not in list
-        try:
-            conn_manager.disconnect(mock_websocket, household_id)
-        except ValueError:
-            # Expected behavior - trying to remove from empty list
-            pass
+        conn_manager.disconnect(mock_websocket, household_id)
+        assert household_id not in conn_manager.active_connections
 
     # ===== Concurrent Access Tests =====
 
-    @pytest.mark.asyncio
     async def test_concurrent_connections(self, conn_manager):
         """Test handling multiple concurrent connection attempts"""
         household_id = "household_001"
         websockets = []
 
         for i in range(10):
-            ws = MagicMock()
-            ws.accept = AsyncMock()
+            ws = FakeWebSocket()
             websockets.append(ws)
 
         # Connect all concurrently
-        import asyncio
         await asyncio.gather(*[
             conn_manager.connect(ws, household_id)
             for ws in websockets
@@ -289,15 +329,13 @@ class TestConnectionManager:
 
         assert len(conn_manager.active_connections[household_id]) == 10
 
-    @pytest.mark.asyncio
     async def test_concurrent_disconnections(self, conn_manager):
         """Test handling multiple concurrent disconnections"""
         household_id = "household_001"
         websockets = []
 
         for i in range(5):
-            ws = MagicMock()
-            ws.accept = AsyncMock()
+            ws = FakeWebSocket()
             await conn_manager.connect(ws, household_id)
             websockets.append(ws)
 
@@ -305,17 +343,78 @@ class TestConnectionManager:
         for ws in websockets:
             conn_manager.disconnect(ws, household_id)
 
-        assert len(conn_manager.active_connections[household_id]) == 0
+        assert household_id not in conn_manager.active_connections
+
+    # ===== Initial State Tests =====
+
+    async def test_concurrent_connects_share_one_state_load(self, conn_manager):
+        """Test concurrent connects trigger a single resident-state load and read from the cache"""
+        household_id = "household_001"
+
+        async def slow_load():
+            await asyncio.sleep(0.01)
+            conn_manager.location_cache[household_id] = {
+                "alice": {"location": "kitchen", "timestamp": "2025-01-15T08:00:00"}
+            }
+            conn_manager._state_loaded = True
+
+        load = AsyncMock(side_effect=slow_load)
+        websockets = []
+        for _ in range(5):
+            websockets.append(FakeWebSocket())
+
+        with patch.object(conn_manager, "_load_resident_state", load):
+            await asyncio.gather(*[
+                conn_manager.add_connection_with_state(ws, household_id)
+                for ws in websockets
+            ])
+
+        assert load.call_count == 1
+        for ws in websockets:
+            sent = orjson.loads(*ws.sent)
+            assert sent["type"] == "initial_state"
+            assert sent["residents"] == {"alice": "kitchen"}
+            assert sent["timestamps"] == {"alice": "2025-01-15T08:00:00"}
+
+    async def test_load_resident_state_replays_compacted_topic(self, conn_manager):
+        """Test resident state is replayed via manual partition assignment up to the end offsets"""
+        from aiokafka import TopicPartition
+        tp = TopicPartition("wellnest-resident-state", 0)
+        records = [
+            MagicMock(value={"household_id": "household_001", "resident": "alice",
+                             "location": "kitchen", "timestamp": "2025-01-15T08:00:00"}),
+            MagicMock(value=None),  # Tombstone
+        ]
+
+        consumer = MagicMock()
+        consumer.start = AsyncMock()
+        consumer.stop = AsyncMock()
+        consumer.topics = AsyncMock(return_value={"wellnest-resident-state"})
+        consumer.partitions_for_topic = MagicMock(return_value={0})
+        consumer.seek_to_beginning = AsyncMock()
+        consumer.end_offsets = AsyncMock(return_value={tp: 2})
+        consumer.getmany = AsyncMock(return_value={tp: records})
+        consumer.position = AsyncMock(return_value=2)
+
+        with patch("app.services.ws_manager.AIOKafkaConsumer", return_value=consumer) as consumer_cls:
+            await conn_manager.load_resident_state()
+
+        # No topic subscription and no consumer group
+        assert consumer_cls.call_args.args == ()
+        assert consumer_cls.call_args.kwargs["group_id"] is None
+        consumer.assign.assert_called_once_with([tp])
+        assert conn_manager._state_loaded is True
+        assert conn_manager.location_cache == {
+            "household_001": {"alice": {"location": "kitchen", "timestamp": "2025-01-15T08:00:00"}}
+        }
+        consumer.stop.assert_called_once()
 
     # ===== Integration Test =====
 
-    @pytest.mark.asyncio
     async def test_full_lifecycle(self, conn_manager):
         """Test complete lifecycle: connect, send alerts, disconnect"""
         household_id = "household_001"
-        ws = MagicMock()
-        ws.accept = AsyncMock()
-        ws.send_json = AsyncMock()
+        ws = FakeWebSocket()
 
         # Connect
         await conn_manager.connect(ws, household_id)
@@ -326,8 +425,34 @@ class TestConnectionManager:
             alert = {"type": f"alert_{i}", "message": f"Test alert {i}"}
             await conn_manager.send_alert(household_id, alert)
 
-        assert ws.send_json.call_count == 3
+        assert len(ws.sent) == 3
 
-        # Disconnect
+        # Disconnect: the household's entry goes with its last connection
         conn_manager.disconnect(ws, household_id)
-        assert ws not in conn_manager.active_connections.get(household_id, [])
+        assert household_id not in conn_manager.active_connections
+
+
+@pytest.mark.benchmark
+class TestConnectionManagerBenchmark:
+    """Latency benchmarks for alert broadcast (run with: pytest -m benchmark -n 0)"""
+
+    def test_bench_send_alert_to_100_clients(self, benchmark):
+        """Broadcasting one alert to 100 connections takes under 1 ms (median)"""
+        conn_manager = ConnectionManager()
+        household_id = "household_001"
+        for _ in range(100):
+            conn_manager.add_connection(FakeWebSocket(), household_id)
+        alert_message = {"type": "alert", "severity": "high", "message": "test"}
+
+        loop = asyncio.new_event_loop()
+        try:
+            benchmark.pedantic(
+                lambda: loop.run_until_complete(conn_manager.send_alert(household_id, alert_message)),
+                rounds=50, warmup_rounds=5
+            )
+        finally:
+            loop.close()
+
+        assert len(conn_manager.active_connections[household_id]) == 100
+        # Median, not max: one slow round (GC, scheduler noise) mustn't fail the benchmark
+        assert benchmark.stats.stats.median < 1e-3
@@ -0,0 +1,55 @@
+"""
+Tests for Kafka Client
+Tests event publishing and delivery-failure accounting
+"""
+import pytest
+from unittest.mock import MagicMock
+from app.db.kafka_client import KafkaClient
+
+
+class TestKafkaClient:
+    """Test suite for Kafka client"""
+
+    @pytest.fixture
+    def producer(self, monkeypatch):
+        producer = MagicMock()
+        monkeypatch.setattr(KafkaClient, "producer", producer)
+        monkeypatch.setattr(KafkaClient, "_topic_events", "wellnest-events")
+        monkeypatch.setattr(KafkaClient, "publish_failures", 0)
+        return producer
+
+    # ===== Publish Tests =====
+
+    def test_publish_event_not_connected(self, monkeypatch):
+        """Test publishing fails when producer is not connected"""
+        monkeypatch.setattr(KafkaClient, "producer", None)
+
+        with pytest.raises(RuntimeError, match="not connected"):
+            KafkaClient.publish_event({"sensor_id": "s1"}, key="household_001")
+
+    def test_publish_event_does_not_wait_for_delivery(self, producer):
+        """Test publish_event hands the event to the producer without blocking on the send"""
+        event = {"sensor_id": "s1"}
+
+        KafkaClient.publish_event(event, key="household_001")
+
+        producer.send.assert_called_once_with("wellnest-events", key="household_001", value=event)
+        future = producer.send.return_value
+        future.get.assert_not_called()
+        future.add_errback.assert_called_once()
+
+    def test_publish_event_delivery_failure_is_counted(self, producer):
+        """Test a failed delivery increments publish_failures instead of raising"""
+        KafkaClient.publish_event({"sensor_id": "s1"}, key="household_001")
+
+        errback = producer.send.return_value.add_errback.call_args[0][0]
+        errback(Exception("Kafka down"))
+
+        assert KafkaClient.publish_failures == 1
+
+    def test_publish_event_send_error_raises(self, producer):
+        """Test errors raised synchronously by send (e.g. buffer full) reach the caller"""
+        producer.send.side_effect = Exception("Buffer full")
+
+        with pytest.raises(Exception, match="Buffer full"):
+            KafkaClient.publish_event({"sensor_id": "s1"}, key="household_001")
@@ -0,0 +1,22 @@
+"""
+Tests for the FastAPI app
+Tests the root and health endpoints
+"""
+
+
+class TestAppEndpoints:
+    """Test top-level API endpoints"""
+
+    def test_root(self, client):
+        """Test root endpoint returns the welcome message"""
+        response = client.get("/")
+
+        assert response.status_code == 200
+        assert response.json() == {"message": "Welcome to Wellnest API"}
+
+    def test_health_check(self, client):
+        """Test health endpoint reports healthy"""
+        response = client.get("/health")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "healthy"}
@@ -3,245 +3,335 @@ Tests for MongoDB Client
 Tests database operations, connection management, and error handling
 """
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, call, patch
 from app.db.mongo import MongoDB
 
 
+def run_now(coro):
+    """Run a coroutine that finishes without suspending (no event loop needed) and return its result"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise AssertionError("coroutine awaited real I/O; use an async test instead")
+
+
+class FakeCursor:
+    """Plain stand-in for a motor cursor that records how MongoDB.read() drives it"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.find_args = None
+        self.sort_spec = None
+        self.limited = None
+        self.to_list_lengths = []
+
+    def find(self, *args):
+        """Install as collection.find: records the query (and projection) and returns this cursor"""
+        self.find_args = args
+        return self
+
+    def sort(self, spec):
+        self.sort_spec = spec
+        return self
+
+    def limit(self, n):
+        self.limited = n
+        return self
+
+    async def to_list(self, length=None):
+        self.to_list_lengths.append(length)
+        return self.docs
+
+
+@pytest.fixture
+def mongo_env(monkeypatch):
+    """Point MongoDB.connect() at a local test database via the environment"""
+    monkeypatch.setenv("MONGODB_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("MONGODB_DATABASE", "test_db")
+    # connect() sets these class attributes; register them so teardown restores the originals
+    monkeypatch.setattr(MongoDB, "client", None)
+    monkeypatch.setattr(MongoDB, "_db_name", MongoDB._db_name)
+
+
+@pytest.fixture
+def mongo_collection(monkeypatch):
+    """Connect MongoDB to a mock client whose every db/collection lookup returns the yielded mock"""
+    collection = MagicMock()
+    db = MagicMock()
+    db.__getitem__ = lambda self, key: collection
+    client = MagicMock()
+    client.__getitem__ = lambda self, key: db
+    monkeypatch.setattr(MongoDB, "client", client)
+    monkeypatch.setattr(MongoDB, "_db_name", "test_db")
+    yield collection
+
+
 class TestMongoDB:
     """Test suite for MongoDB client"""
 
     # ===== Connection Tests =====
 
-    @pytest.mark.asyncio
-    async def test_connect_success(self):
+    async def test_connect_success(self, mongo_env):
         """Test successful MongoDB connection"""
         with patch('app.db.mongo.AsyncIOMotorClient') as mock_client:
             mock_instance = MagicMock()
             mock_instance.admin.command = AsyncMock(return_value={"ok": 1})
             mock_client.return_value = mock_instance
 
-            with patch('app.db.mongo.os.getenv') as mock_getenv:
-                mock_getenv.side_effect = lambda key, default=None: {
-                    "MONGODB_URL": "mongodb://localhost:27017",
-                    "MONGODB_DATABASE": "test_db"
-                }.get(key, default)
-
-                await MongoDB.connect()
+            await MongoDB.connect()
 
-                assert MongoDB.client is not None
-                assert MongoDB._db_name == "test_db"
-                mock_instance.admin.command.assert_called_once_with('ping')
+            assert MongoDB.client is not None
+            assert MongoDB._db_name == "test_db"
+            assert mock_instance.admin.command.call_count == 1
+            assert mock_instance.admin.command.call_args == call('ping')
 
-    @pytest.mark.asyncio
-    async def test_connect_missing_url(self):
+    def test_connect_missing_url(self, monkeypatch):
         """Test connection fails when URL is missing"""
-        with patch('app.db.mongo.os.getenv', return_value=None):
-            with pytest.raises(ValueError, match="MONGODB_URL not found"):
-                await MongoDB.connect()
+        monkeypatch.delenv("MONGODB_URL", raising=False)
+        monkeypatch.setattr(MongoDB, "_db_name", MongoDB._db_name)
+
+        with pytest.raises(ValueError, match="MONGODB_URL not found"):
+            run_now(MongoDB.connect())
 
-    @pytest.mark.asyncio
-    async def test_connect_failure(self):
+    async def test_connect_failure(self, mongo_env):
         """Test connection failure handling"""
         with patch('app.db.mongo.AsyncIOMotorClient') as mock_client:
             mock_instance = MagicMock()
             mock_instance.admin.command = AsyncMock(side_effect=Exception("Connection failed"))
             mock_client.return_value = mock_instance
 
-            with patch('app.db.mongo.os.getenv') as mock_getenv:
-                mock_getenv.side_effect = lambda key, default=None: {
-                    "MONGODB_URL": "mongodb://localhost:27017",
-                    "MONGODB_DATABASE": "test_db"
-                }.get(key, default)
-
-                with pytest.raises(Exception, match="Connection failed"):
-                    await MongoDB.connect()
+            with pytest.raises(Exception, match="Connection failed"):
+                await MongoDB.connect()
 
     # ===== Write Tests =====
 
-    @pytest.mark.asyncio
-    async def test_write_document(self):
+    async def test_write_document(self, mongo_collection):
         """Test writing a document to MongoDB"""
-        mock_collection = MagicMock()
         mock_result = MagicMock()
         mock_result.inserted_id = "test_id_123"
-        mock_collection.insert_one = AsyncMock(return_value=mock_result)
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.insert_one = AsyncMock(return_value=mock_result)
 
         document = {"test": "data", "value": 123}
         result = await MongoDB.write("test_collection", document)
 
         assert result == "test_id_123"
-        mock_collection.insert_one.assert_called_once_with(document)
+        assert mongo_collection.insert_one.call_count == 1
+        assert mongo_collection.insert_one.call_args == call(document)
 
-    @pytest.mark.asyncio
-    async def test_write_without_connection(self):
+    def test_write_without_connection(self, monkeypatch):
         """Test write fails when not connected"""
-        MongoDB.client = None
+        monkeypatch.setattr(MongoDB, "client", None)
 
         with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
-            await MongoDB.write("test_collection", {"test": "data"})
+            run_now(MongoDB.write("test_collection", {"test": "data"}))
 
-    # ===== Read Tests =====
+    async def test_write_many_documents(self, mongo_collection):
+        """Test several documents go out as one unordered insert_many"""
+        mock_result = MagicMock()
+        mock_result.inserted_ids = ["h1", "h2"]
+        mongo_collection.insert_many = AsyncMock(return_value=mock_result)
 
-    @pytest.mark.asyncio
-    async def test_read_documents(self):
-        """Test reading documents from MongoDB"""
-        mock_docs = [
-            {"_id": "id1", "data": "test1"},
-            {"_id": "id2", "data": "test2"}
-        ]
+        documents = [{"_id": "h1"}, {"_id": "h2"}]
+        result = await MongoDB.write_many("households", documents)
 
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=mock_docs)
-        mock_cursor.limit = lambda x: mock_cursor
-        mock_cursor.sort = lambda x: mock_cursor
+        assert result == ["h1", "h2"]
+        assert mongo_collection.insert_many.call_count == 1
+        assert mongo_collection.insert_many.call_args == call(documents, ordered=False)
 
-        mock_collection = MagicMock()
-        mock_collection.find = MagicMock(return_value=mock_cursor)
+    def test_write_many_empty(self, mongo_collection):
+        """Test an empty list is a no-op instead of an insert_many error"""
+        mongo_collection.insert_many = AsyncMock()
 
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
+        assert run_now(MongoDB.write_many("households", [])) == []
+        assert mongo_collection.insert_many.call_count == 0
 
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
+    def test_write_many_without_connection(self, monkeypatch):
+        """Test write_many fails when not connected"""
+        monkeypatch.setattr(MongoDB, "client", None)
 
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
+            run_now(MongoDB.write_many("test_collection", [{"test": "data"}]))
 
-        result = await MongoDB.read("test_collection", query={"field": "value"}, limit=2)
+    async def test_upsert_document(self, mongo_collection):
+        """Test upsert issues a single update_one with upsert=True"""
+        mock_result = MagicMock()
+        mock_result.upserted_id = "household_001_2025-01-15"
+        mongo_collection.update_one = AsyncMock(return_value=mock_result)
 
-        assert len(result) == 2
-        # IDs should be converted to strings
-        assert all(isinstance(doc["_id"], str) for doc in result)
+        query = {"_id": "household_001_2025-01-15"}
+        document = {"_id": "household_001_2025-01-15", "wake_up_time": "06:30"}
+        inserted = await MongoDB.upsert("daily_routines", query, document)
 
-    @pytest.mark.asyncio
-    async def test_read_with_sort(self):
-        """Test reading documents with sorting"""
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=[])
-        mock_cursor.limit = lambda x: mock_cursor
+        assert inserted is True
+        assert mongo_collection.update_one.call_count == 1
+        assert mongo_collection.update_one.call_args == call(query, {"$set": document}, upsert=True)
 
-        sort_called = False
-        def mock_sort(sort_params):
-            nonlocal sort_called
-            sort_called = True
-            return mock_cursor
+    def test_upsert_without_connection(self, monkeypatch):
+        """Test upsert fails when not connected"""
+        monkeypatch.setattr(MongoDB, "client", None)
 
-        mock_cursor.sort = mock_sort
+        with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
+            run_now(MongoDB.upsert("test_collection", {"_id": "x"}, {"test": "data"}))
 
-        mock_collection = MagicMock()
-        mock_collection.find = MagicMock(return_value=mock_cursor)
+    async def test_write_batched_coalesces_concurrent_writes(self, mongo_collection):
+        """Test that concurrent batched writes go out as one insert_many"""
+        import asyncio
 
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
+        mongo_collection.insert_many = AsyncMock()
 
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
+        documents = [{"_id": f"event_{i}"} for i in range(50)]
+        results = await asyncio.gather(*(
+            MongoDB.write_batched("events", doc, flush_after=50) for doc in documents
+        ))
 
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        assert results == [f"event_{i}" for i in range(50)]
+        assert mongo_collection.insert_many.call_count == 1
+        assert mongo_collection.insert_many.call_args == call(documents, ordered=False)
 
-        await MongoDB.read("test_collection", query={}, sort=[("timestamp", 1)])
+    async def test_write_batched_flushes_after_linger(self, mongo_collection):
+        """Test that a partial batch is written once linger_ms expires"""
+        mongo_collection.insert_many = AsyncMock()
 
-        assert sort_called
+        result = await MongoDB.write_batched("events", {"_id": "event_1"}, linger_ms=1)
 
-    @pytest.mark.asyncio
-    async def test_read_without_limit(self):
-        """Test reading all documents without limit"""
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=[{"_id": "id1"}])
+        assert result == "event_1"
+        assert mongo_collection.insert_many.call_count == 1
+        assert mongo_collection.insert_many.call_args == call([{"_id": "event_1"}], ordered=False)
 
-        limit_called = False
-        def mock_limit(x):
-            nonlocal limit_called
-            if x:
-                limit_called = True
-            return mock_cursor
+    async def test_write_batched_reports_per_document_errors(self, mongo_collection):
+        """Test that only the documents rejected by insert_many see an error"""
+        import asyncio
+        from pymongo.errors import BulkWriteError, WriteError
 
-        mock_cursor.limit = mock_limit
-        mock_cursor.sort = lambda x: mock_cursor
+        mongo_collection.insert_many = AsyncMock(side_effect=BulkWriteError({
+            "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}]
+        }))
 
-        mock_collection = MagicMock()
-        mock_collection.find = MagicMock(return_value=mock_cursor)
+        results = await asyncio.gather(
+            MongoDB.write_batched("events", {"_id": "event_1"}, flush_after=2),
+            MongoDB.write_batched("events", {"_id": "event_1"}, flush_after=2),
+            return_exceptions=True
+        )
 
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
+        assert results[0] == "event_1"
+        assert isinstance(results[1], WriteError)
+        assert results[1].code == 11000
 
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
+    async def test_write_batched_survives_cancelled_caller(self, mongo_collection):
+        """Test that cancelling the caller that filled a batch doesn't strand the other callers"""
+        import asyncio
+
+        started = asyncio.Event()
+        release = asyncio.Event()
 
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        async def slow_insert_many(documents, ordered):
+            started.set()
+            await release.wait()
+
+        mongo_collection.insert_many = slow_insert_many
+
+        first = asyncio.ensure_future(MongoDB.write_batched("events", {"_id": "event_1"}, flush_after=3))
+        second = asyncio.ensure_future(MongoDB.write_batched("events", {"_id": "event_2"}, flush_after=3))
+        third = asyncio.ensure_future(MongoDB.write_batched("events", {"_id": "event_3"}, flush_after=3))
+        await started.wait()
+        third.cancel()
+        release.set()
+
+        assert await asyncio.wait_for(asyncio.gather(first, second), timeout=1) == ["event_1", "event_2"]
+        assert third.cancelled()
+
+    def test_write_batched_without_connection(self, monkeypatch):
+        """Test batched write fails when not connected"""
+        monkeypatch.setattr(MongoDB, "client", None)
+
+        with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
+            run_now(MongoDB.write_batched("test_collection", {"test": "data"}))
+
+    # ===== Read Tests =====
+
+    async def test_read_documents(self, mongo_collection):
+        """Test reading documents from MongoDB"""
+        mock_docs = [
+            {"_id": "id1", "data": "test1"},
+            {"_id": "id2", "data": "test2"}
+        ]
+
+        mongo_collection.find = FakeCursor(mock_docs).find
+
+        result = await MongoDB.read("test_collection", query={"field": "value"}, limit=2)
+
+        assert len(result) == 2
+        # IDs should be converted to strings
+        assert all(isinstance(doc["_id"], str) for doc in result)
+
+    async def test_read_with_sort(self, mongo_collection):
+        """Test reading documents with sorting"""
+        cursor = FakeCursor([])
+        mongo_collection.find = cursor.find
+
+        await MongoDB.read("test_collection", query={}, sort=[("timestamp", 1)])
+
+        assert cursor.sort_spec == [("timestamp", 1)]
+
+    async def test_read_without_limit(self, mongo_collection):
+        """Test reading all documents without limit"""
+        cursor = FakeCursor([{"_id": "id1"}])
+        mongo_collection.find = cursor.find
 
         # Call with limit=0 (no limit)
         await MongoDB.read("test_collection", query={}, limit=0)
 
-        # to_list should be called with None when no limit
-        mock_cursor.to_list.assert_called_once_with(length=None)
+        # No limit applied, and to_list should be called with None
+        assert cursor.limited is None
+        assert cursor.to_list_lengths == [None]
+
+    async def test_read_with_projection(self, mongo_collection):
+        """Test projection is forwarded to find"""
+        cursor = FakeCursor([{"household_id": "household_001"}])
+        mongo_collection.find = cursor.find
+
+        projection = {"_id": 0, "household_id": 1}
+        result = await MongoDB.read("events", query={"household_id": "household_001"}, limit=1, projection=projection)
 
-    @pytest.mark.asyncio
-    async def test_read_without_connection(self):
+        assert result == [{"household_id": "household_001"}]
+        assert cursor.find_args == ({"household_id": "household_001"}, projection)
+        assert cursor.limited == 1
+
+    def test_read_without_connection(self, monkeypatch):
         """Test read fails when not connected"""
-        MongoDB.client = None
+        monkeypatch.setattr(MongoDB, "client", None)
 
         with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
-            await MongoDB.read("test_collection")
+            run_now(MongoDB.read("test_collection"))
 
     # ===== Distinct Tests =====
 
-    @pytest.mark.asyncio
-    async def test_distinct_values(self):
+    async def test_distinct_values(self, mongo_collection):
         """Test getting distinct values"""
-        mock_collection = MagicMock()
-        mock_collection.distinct = AsyncMock(return_value=["value1", "value2", "value3"])
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.distinct = AsyncMock(return_value=["value1", "value2", "value3"])
 
         result = await MongoDB.distinct("test_collection", "field_name")
 
         assert result == ["value1", "value2", "value3"]
-        mock_collection.distinct.assert_called_once_with("field_name", {})
+        assert mongo_collection.distinct.call_count == 1
+        assert mongo_collection.distinct.call_args == call("field_name", {})
 
-    @pytest.mark.asyncio
-    async def test_distinct_with_query(self):
+    async def test_distinct_with_query(self, mongo_collection):
         """Test getting distinct values with query filter"""
-        mock_collection = MagicMock()
-        mock_collection.distinct = AsyncMock(return_value=["household_001"])
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.distinct = AsyncMock(return_value=["household_001"])
 
         query = {"date": {"$gte": "2025-01-01"}}
         result = await MongoDB.distinct("events", "household_id", query)
 
         assert result == ["household_001"]
-        mock_collection.distinct.assert_called_once_with("household_id", query)
+        assert mongo_collection.distinct.call_count == 1
+        assert mongo_collection.distinct.call_args == call("household_id", query)
 
     # ===== Aggregate Tests =====
 
-    @pytest.mark.asyncio
-    async def test_aggregate_pipeline(self):
+    async def test_aggregate_pipeline(self, mongo_collection):
         """Test running aggregation pipeline"""
         mock_results = [
             {"_id": "household_001", "count": 100},
@@ -251,17 +341,7 @@ class TestMongoDB:
         mock_cursor = MagicMock()
         mock_cursor.to_list = AsyncMock(return_value=mock_results)
 
-        mock_collection = MagicMock()
-        mock_collection.aggregate = MagicMock(return_value=mock_cursor)
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.aggregate = MagicMock(return_value=mock_cursor)
 
         pipeline = [
             {"$match": {"date": "2025-01-15"}},
@@ -273,42 +353,75 @@ class TestMongoDB:
         assert len(result) == 2
         # IDs should be converted to strings
         assert all(isinstance(doc["_id"], str) for doc in result)
-        mock_collection.aggregate.assert_called_once_with(pipeline)
+        assert mongo_collection.aggregate.call_count == 1
+        assert mongo_collection.aggregate.call_args == call(pipeline)
 
-    @pytest.mark.asyncio
-    async def test_aggregate_without_connection(self):
+    def test_aggregate_without_connection(self, monkeypatch):
         """Test aggregate fails when not connected"""
-        MongoDB.client = None
+        monkeypatch.setattr(MongoDB, "client", None)
+
+        with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
+            run_now(MongoDB.aggregate("test_collection", []))
+
+    # ===== Index Tests =====
+
+    async def test_ensure_indexes_creates_compound_indexes(self, monkeypatch):
+        """Test ensure_indexes builds (household_id, timestamp desc) on events and alerts"""
+        collections = {}
+
+        def get_collection(self, key):
+            if key not in collections:
+                collection = MagicMock()
+                collection.create_index = AsyncMock(return_value="household_id_1_timestamp_-1")
+                collections[key] = collection
+            return collections[key]
+
+        mock_db = MagicMock()
+        mock_db.__getitem__ = get_collection
+
+        mock_client = MagicMock()
+        mock_client.__getitem__ = lambda self, key: mock_db
+
+        monkeypatch.setattr(MongoDB, "client", mock_client)
+        monkeypatch.setattr(MongoDB, "_db_name", "test_db")
+
+        await MongoDB.ensure_indexes()
+
+        assert set(collections) == {"events", "alerts"}
+        for collection in collections.values():
+            assert collection.create_index.call_count == 1
+            assert collection.create_index.call_args == call([("household_id", 1), ("timestamp", -1)])
+
+    def test_create_index_without_connection(self, monkeypatch):
+        """Test create_index fails when not connected"""
+        monkeypatch.setattr(MongoDB, "client", None)
 
         with pytest.raises(RuntimeError, match="MongoDB client is not connected"):
-            await MongoDB.aggregate("test_collection", [])
+            run_now(MongoDB.create_index("events", [("household_id", 1)]))
 
     # ===== Close Tests =====
 
-    @pytest.mark.asyncio
-    async def test_close_connection(self):
+    async def test_close_connection(self, monkeypatch):
         """Test closing MongoDB connection"""
         mock_client = MagicMock()
         mock_client.close = MagicMock()
 
-        MongoDB.client = mock_client
+        monkeypatch.setattr(MongoDB, "client", mock_client)
 
         await MongoDB.close()
 
-        mock_client.close.assert_called_once()
+        assert mock_client.close.call_count == 1
 
-    @pytest.mark.asyncio
-    async def test_close_without_client(self):
+    def test_close_without_client(self, monkeypatch):
         """Test closing when no client exists"""
-        MongoDB.client = None
+        monkeypatch.setattr(MongoDB, "client", None)
 
         # Should not raise exception
-        await MongoDB.close()
+        run_now(MongoDB.close())
 
     # ===== ID Conversion Tests =====
 
-    @pytest.mark.asyncio
-    async def test_objectid_to_string_conversion(self):
+    async def test_objectid_to_string_conversion(self, mongo_collection):
         """Test that ObjectId is converted to string"""
         from bson import ObjectId
 
@@ -316,22 +429,7 @@ class TestMongoDB:
             {"_id": ObjectId("507f1f77bcf86cd799439011"), "data": "test"}
         ]
 
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=mock_docs)
-        mock_cursor.limit = lambda x: mock_cursor
-        mock_cursor.sort = lambda x: mock_cursor
-
-        mock_collection = MagicMock()
-        mock_collection.find = MagicMock(return_value=mock_cursor)
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.find = FakeCursor(mock_docs).find
 
         result = await MongoDB.read("test_collection")
 
@@ -341,58 +439,20 @@ class TestMongoDB:
 
     # ===== Query Edge Cases =====
 
-    @pytest.mark.asyncio
-    async def test_read_empty_result(self):
+    async def test_read_empty_result(self, mongo_collection):
         """Test reading when no documents match"""
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=[])
-        mock_cursor.limit = lambda x: mock_cursor
-        mock_cursor.sort = lambda x: mock_cursor
-
-        mock_collection = MagicMock()
-        mock_collection.find = MagicMock(return_value=mock_cursor)
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        mongo_collection.find = FakeCursor([]).find
 
         result = await MongoDB.read("test_collection", query={"nonexistent": "value"})
 
         assert result == []
 
-    @pytest.mark.asyncio
-    async def test_read_with_none_query(self):
+    async def test_read_with_none_query(self, mongo_collection):
         """Test reading with None query (should default to empty dict)"""
-        mock_cursor = MagicMock()
-        mock_cursor.to_list = AsyncMock(return_value=[])
-        mock_cursor.limit = lambda x: mock_cursor
-        mock_cursor.sort = lambda x: mock_cursor
-
-        mock_collection = MagicMock()
-        find_called_with = None
-
-        def mock_find(query):
-            nonlocal find_called_with
-            find_called_with = query
-            return mock_cursor
-
-        mock_collection.find = mock_find
-
-        mock_db = MagicMock()
-        mock_db.__getitem__ = lambda self, key: mock_collection
-
-        mock_client = MagicMock()
-        mock_client.__getitem__ = lambda self, key: mock_db
-
-        MongoDB.client = mock_client
-        MongoDB._db_name = "test_db"
+        cursor = FakeCursor([])
+        mongo_collection.find = cursor.find
 
         await MongoDB.read("test_collection", query=None)
 
         # Should default to empty dict
-        assert find_called_with == {}
+        assert cursor.find_args == ({},)
@@ -2,7 +2,6 @@
 Tests for Routine Learner
 Tests routine extraction, baseline aggregation, and scheduling
 """
-import pytest
 from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 from app.scheduler.routine_learner import (
@@ -13,6 +12,7 @@ from app.scheduler.routine_learner import (
     batch_routine_learner_daily,
     aggregate_baselines
 )
+from app.services.nim_llm_service import NIMLLMService
 
 
 class TestRoutineExtraction:
@@ -118,9 +118,9 @@ class TestSummaryGeneration:
     """Test summary text generation"""
 
     @patch.dict('os.environ', {}, clear=True)
-    def test_generate_summary_complete_data_no_llm(self, daily_routine_sample):
+    async def test_generate_summary_complete_data_no_llm(self, daily_routine_sample):
         """Test summary with complete routine data (template fallback)"""
-        summary = generate_summary(daily_routine_sample)
+        summary = await generate_summary(daily_routine_sample)
 
         assert "Woke up at 06:30" in summary
         assert "kitchen activity at 07:00" in summary
@@ -129,7 +129,7 @@ class TestSummaryGeneration:
         assert "45 sensor events" in summary
 
     @patch.dict('os.environ', {}, clear=True)
-    def test_generate_summary_partial_data(self):
+    async def test_generate_summary_partial_data(self):
         """Test summary with partial routine data"""
         partial_routine = {
             "wake_up_time": "07:00",
@@ -137,25 +137,26 @@ class TestSummaryGeneration:
             "total_events": 20
         }
 
-        summary = generate_summary(partial_routine)
+        summary = await generate_summary(partial_routine)
 
         assert "Woke up at 07:00" in summary
         assert "kitchen activity at 07:30" in summary
         assert "20 sensor events" in summary
 
     @patch.dict('os.environ', {}, clear=True)
-    def test_generate_summary_no_data(self):
+    async def test_generate_summary_no_data(self):
         """Test summary with no significant data"""
         empty_routine = {
             "total_events": 0
         }
 
-        summary = generate_summary(empty_routine)
+        summary = await generate_summary(empty_routine)
 
-        assert "No significant activity detected" in summary
+        # Zero counts are no activity, so the LLM is skipped
+        assert summary == NIMLLMService.EMPTY_ROUTINE_SUMMARY
 
     @patch.dict('os.environ', {}, clear=True)
-    def test_generate_summary_activity_fallback(self):
+    async def test_generate_summary_activity_fallback(self):
         """Test summary uses activity_start when wake_up_time missing"""
         routine = {
             "activity_start": "08:00",
@@ -163,44 +164,44 @@ class TestSummaryGeneration:
             "total_events": 15
         }
 
-        summary = generate_summary(routine)
+        summary = await generate_summary(routine)
 
         assert "First activity at 08:00" in summary
         assert "last activity at 20:00" in summary
 
     @patch.dict('os.environ', {"NIM_API_KEY": "test_key"})
-    @patch('app.scheduler.routine_learner.NIMLLMService.get_llama3_summary')
-    def test_generate_summary_with_llm_success(self, mock_llm_service, daily_routine_sample):
-        """Test that generate_summary calls LLM service when API key is available"""
+    @patch('app.scheduler.routine_learner.NIMLLMService.aget_llama3_summary', new_callable=AsyncMock)
+    async def test_generate_summary_with_llm_success(self, mock_llm_service, daily_routine_sample):
+        """Test that generate_summary awaits the LLM service when API key is available"""
         mock_llm_service.return_value = "The household maintained a regular morning routine starting at 6:30 AM. Evening activities concluded normally with bedtime at 10:00 PM."
 
-        summary = generate_summary(daily_routine_sample)
+        summary = await generate_summary(daily_routine_sample)
 
         # Verify LLM service was called
-        mock_llm_service.assert_called_once_with(daily_routine_sample)
+        mock_llm_service.assert_awaited_once_with(daily_routine_sample)
 
         # Verify we got the LLM summary
         assert summary == "The household maintained a regular morning routine starting at 6:30 AM. Evening activities concluded normally with bedtime at 10:00 PM."
         assert "Woke up at" not in summary  # Should not be template-based
 
     @patch.dict('os.environ', {"NIM_API_KEY": "test_key"})
-    @patch('app.scheduler.routine_learner.NIMLLMService.get_llama3_summary')
-    def test_generate_summary_llm_fallback_on_error(self, mock_llm_service, daily_routine_sample):
+    @patch('app.scheduler.routine_learner.NIMLLMService.aget_llama3_summary', new_callable=AsyncMock)
+    async def test_generate_summary_llm_fallback_on_error(self, mock_llm_service, daily_routine_sample):
         """Test that generate_summary falls back to template when LLM fails"""
         mock_llm_service.side_effect = Exception("API Error")
 
-        summary = generate_summary(daily_routine_sample)
+        summary = await generate_summary(daily_routine_sample)
 
         # Verify LLM service was attempted
-        mock_llm_service.assert_called_once_with(daily_routine_sample)
+        mock_llm_service.assert_awaited_once_with(daily_routine_sample)
 
         # Verify we got the template fallback
         assert "Woke up at 06:30" in summary
         assert "kitchen activity at 07:00" in summary
 
     @patch.dict('os.environ', {"NIM_API_KEY": "test_key"})
-    @patch('app.scheduler.routine_learner.NIMLLMService.get_llama3_summary')
-    def test_generate_summary_llm_with_api_key_error(self, mock_llm_service):
+    @patch('app.scheduler.routine_learner.NIMLLMService.aget_llama3_summary', new_callable=AsyncMock)
+    async def test_generate_summary_llm_with_api_key_error(self, mock_llm_service):
         """Test fallback when NIM_API_KEY is invalid"""
         mock_llm_service.side_effect = KeyError("NIM_API_KEY not found")
 
@@ -210,15 +211,15 @@ class TestSummaryGeneration:
             "total_events": 50
         }
 
-        summary = generate_summary(routine)
+        summary = await generate_summary(routine)
 
         # Should fallback to template
         assert "Woke up at 07:00" in summary
         assert "went to bed at 22:00" in summary
 
     @patch.dict('os.environ', {"NIM_API_KEY": "test_key"})
-    @patch('app.scheduler.routine_learner.NIMLLMService.get_llama3_summary')
-    def test_generate_summary_llm_returns_empty_string(self, mock_llm_service):
+    @patch('app.scheduler.routine_learner.NIMLLMService.aget_llama3_summary', new_callable=AsyncMock)
+    async def test_generate_summary_llm_returns_empty_string(self, mock_llm_service):
         """Test fallback when LLM returns empty string"""
         mock_llm_service.return_value = ""
 
@@ -227,7 +228,7 @@ class TestSummaryGeneration:
             "total_events": 50
         }
 
-        summary = generate_summary(routine)
+        summary = await generate_summary(routine)
 
         # Empty string is valid, but should be returned
         assert summary == ""
@@ -236,7 +237,6 @@ class TestSummaryGeneration:
 class TestProfileSaving:
     """Test saving routine profiles"""
 
-    @pytest.mark.asyncio
     async def test_save_profile_with_summary(self, mock_mongodb):
         """Test saving profile with provided summary"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
@@ -249,17 +249,16 @@ class TestProfileSaving:
 
             await save_profile(household_id, profile_dict, summary)
 
-            mock_mongodb.write.assert_called_once()
-            call_args = mock_mongodb.write.call_args[0]
+            mock_mongodb.upsert.assert_called_once()
+            call_args = mock_mongodb.upsert.call_args[0]
             assert call_args[0] == "daily_routines"
 
-            saved_doc = call_args[1]
+            saved_doc = call_args[2]
             assert saved_doc["household_id"] == household_id
             assert saved_doc["summary_text"] == summary
             assert "_id" in saved_doc
             assert "date" in saved_doc
 
-    @pytest.mark.asyncio
     async def test_save_profile_generates_summary(self, mock_mongodb):
         """Test profile saves with auto-generated summary"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
@@ -272,8 +271,8 @@ class TestProfileSaving:
 
             await save_profile(household_id, profile_dict)
 
-            mock_mongodb.write.assert_called_once()
-            saved_doc = mock_mongodb.write.call_args[0][1]
+            mock_mongodb.upsert.assert_called_once()
+            saved_doc = mock_mongodb.upsert.call_args[0][2]
             assert "summary_text" in saved_doc
             assert len(saved_doc["summary_text"]) > 0
 
@@ -281,7 +280,6 @@ class TestProfileSaving:
 class TestBatchRoutineLearner:
     """Test batch routine learning"""
 
-    @pytest.mark.asyncio
     async def test_batch_learner_no_events(self, mock_mongodb):
         """Test batch learner with no events"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
@@ -293,12 +291,11 @@ class TestBatchRoutineLearner:
             assert result["events_found"] == 0
             assert result["households_processed"] == 0
 
-    @pytest.mark.asyncio
     async def test_batch_learner_single_household(self, mock_mongodb, sample_events_sequence):
         """Test batch learner with single household"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
             mock_mongodb.read = AsyncMock(return_value=sample_events_sequence)
-            mock_mongodb.write = AsyncMock(return_value="profile_id")
+            mock_mongodb.upsert = AsyncMock(return_value=True)
 
             result = await batch_routine_learner_daily()
 
@@ -306,9 +303,8 @@ class TestBatchRoutineLearner:
             assert result["households_processed"] == 1
             assert result["events_found"] == len(sample_events_sequence)
             # Should have written one profile
-            mock_mongodb.write.assert_called()
+            mock_mongodb.upsert.assert_called()
 
-    @pytest.mark.asyncio
     async def test_batch_learner_multiple_households(self, mock_mongodb):
         """Test batch learner with multiple households"""
         events_h1 = [
@@ -322,14 +318,14 @@ class TestBatchRoutineLearner:
 
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
             mock_mongodb.read = AsyncMock(return_value=events_h1 + events_h2)
-            mock_mongodb.write = AsyncMock(return_value="profile_id")
+            mock_mongodb.upsert = AsyncMock(return_value=True)
 
             result = await batch_routine_learner_daily()
 
             assert result["status"] == "success"
             assert result["households_processed"] == 2
             # Should have written two profiles
-            assert mock_mongodb.write.call_count == 2
+            assert mock_mongodb.upsert.call_count == 2
 
     def test_get_yesterday_range(self):
         """Test getting yesterday's date range"""
@@ -350,7 +346,6 @@ class TestBatchRoutineLearner:
 class TestBaselineAggregation:
     """Test baseline aggregation"""
 
-    @pytest.mark.asyncio
     async def test_aggregate_baselines_single_household(self, mock_mongodb, multiple_daily_routines):
         """Test baseline aggregation for single household"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
@@ -358,13 +353,13 @@ class TestBaselineAggregation:
             mock_mongodb.aggregate = AsyncMock(return_value=[{"_id": "household_001"}])
             # Mock read to return daily routines
             mock_mongodb.read = AsyncMock(return_value=multiple_daily_routines)
-            mock_mongodb.write = AsyncMock(return_value="baseline_id")
+            mock_mongodb.upsert = AsyncMock(return_value=True)
 
             await aggregate_baselines(n_days=7)
 
             # Should write one baseline
-            mock_mongodb.write.assert_called_once()
-            baseline = mock_mongodb.write.call_args[0][1]
+            mock_mongodb.upsert.assert_called_once()
+            baseline = mock_mongodb.upsert.call_args[0][2]
 
             assert baseline["household_id"] == "household_001"
             assert baseline["baseline_type"] == "rolling7"
@@ -372,17 +367,16 @@ class TestBaselineAggregation:
             assert "bathroom_visits" in baseline
             assert "computed_at" in baseline
 
-    @pytest.mark.asyncio
     async def test_aggregate_baselines_statistics(self, mock_mongodb, multiple_daily_routines):
         """Test that baseline contains statistical summaries"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
             mock_mongodb.aggregate = AsyncMock(return_value=[{"_id": "household_001"}])
             mock_mongodb.read = AsyncMock(return_value=multiple_daily_routines)
-            mock_mongodb.write = AsyncMock(return_value="baseline_id")
+            mock_mongodb.upsert = AsyncMock(return_value=True)
 
             await aggregate_baselines(n_days=7)
 
-            baseline = mock_mongodb.write.call_args[0][1]
+            baseline = mock_mongodb.upsert.call_args[0][2]
 
             # Check wake time stats
             wake_stats = baseline["wake_up_time"]
@@ -398,7 +392,6 @@ class TestBaselineAggregation:
             assert "daily_median" in bathroom_stats
             assert "max_daily" in bathroom_stats
 
-    @pytest.mark.asyncio
     async def test_aggregate_baselines_no_households(self, mock_mongodb):
         """Test baseline aggregation with no households"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
@@ -407,19 +400,18 @@ class TestBaselineAggregation:
             await aggregate_baselines(n_days=7)
 
             # Should not write any baselines
-            mock_mongodb.write.assert_not_called()
+            mock_mongodb.upsert.assert_not_called()
 
-    @pytest.mark.asyncio
     async def test_aggregate_baselines_data_quality(self, mock_mongodb, multiple_daily_routines):
         """Test that baseline includes data quality metrics"""
         with patch('app.scheduler.routine_learner.MongoDB', mock_mongodb):
             mock_mongodb.aggregate = AsyncMock(return_value=[{"_id": "household_001"}])
             mock_mongodb.read = AsyncMock(return_value=multiple_daily_routines)
-            mock_mongodb.write = AsyncMock(return_value="baseline_id")
+            mock_mongodb.upsert = AsyncMock(return_value=True)
 
             await aggregate_baselines(n_days=7)
 
-            baseline = mock_mongodb.write.call_args[0][1]
+            baseline = mock_mongodb.upsert.call_args[0][2]
 
             assert "data_quality" in baseline
             quality = baseline["data_quality"]
@@ -3,30 +3,39 @@ Tests for Pydantic Schemas
 Tests data validation, serialization, and model behavior
 """
 import pytest
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 from app.schema.event import Event, EventCreate, EventResponse
 from app.api.api_schema import EventIngestResponse, BatchIngestResponse
 
+# Validators built once for the dict-based tests
+_EVENT_TA = TypeAdapter(Event)
+_EVENT_CREATE_TA = TypeAdapter(EventCreate)
+
 
 class TestEventSchemas:
     """Test Event schema models"""
 
     def test_event_create_valid(self, sample_event_create):
         """Test creating valid EventCreate"""
-        event = EventCreate(**sample_event_create)
+        event = _EVENT_CREATE_TA.validate_python(sample_event_create)
 
         assert event.household_id == sample_event_create["household_id"]
         assert event.sensor_type == sample_event_create["sensor_type"]
         assert event.timestamp == sample_event_create["timestamp"]
 
+    def test_event_create_is_frozen(self, event_create):
+        """Test EventCreate can't be modified after validation"""
+        with pytest.raises(ValidationError):
+            event_create.value = "False"
+
     def test_event_create_missing_required_field(self):
         """Test EventCreate fails without required fields"""
         with pytest.raises(ValidationError):
-            EventCreate(household_id="test", sensor_id="sensor1")
+            _EVENT_CREATE_TA.validate_python({"household_id": "test", "sensor_id": "sensor1"})
 
     def test_event_full_valid(self, sample_event):
         """Test creating full Event model"""
-        event = Event(**sample_event)
+        event = _EVENT_TA.validate_python(sample_event)
 
         assert event.event_id == sample_event["event_id"]
         assert event.household_id == sample_event["household_id"]
@@ -47,20 +56,27 @@ class TestEventSchemas:
         assert event.resident is None
 
     def test_event_response_inherits_event(self, sample_event):
-        """Test EventResponse is based on Event"""
-        event_response = EventResponse(**sample_event)
+        """Test EventResponse is based on Event, whether validated or built from trusted data"""
+        for event_response in (EventResponse(**sample_event), EventResponse.from_trusted(sample_event)):
+            assert isinstance(event_response, Event)
+            assert event_response.event_id == sample_event["event_id"]
+
+    def test_from_trusted_matches_validated(self, sample_event):
+        """Test from_trusted builds the same model and dump as full validation"""
+        trusted = EventResponse.from_trusted(sample_event)
+        validated = EventResponse(**sample_event)
 
-        assert isinstance(event_response, Event)
-        assert event_response.event_id == sample_event["event_id"]
+        assert trusted == validated
+        assert trusted.model_dump(exclude_none=True) == validated.model_dump(exclude_none=True)
 
-    def test_event_serialization(self, sample_event):
+    def test_event_serialization(self, event_model):
         """Test Event can be serialized to dict"""
-        event = Event(**sample_event)
-        event_dict = event.model_dump()
+        event_dict = event_model.model_dump()
 
         assert isinstance(event_dict, dict)
         assert "event_id" in event_dict
         assert "household_id" in event_dict
+        assert event_model.as_dict() == event_dict
 
     def test_event_with_alias(self):
         """Test Event uses alias for household_id"""
@@ -74,7 +90,7 @@ class TestEventSchemas:
             "value": "True"
         }
 
-        event = Event(**event_data)
+        event = _EVENT_TA.validate_python(event_data)
         assert event.household_id == "household_001"
 
 
@@ -184,7 +200,7 @@ class TestSchemaValidation:
             "extra_field": "ignored"  # Should be ignored
         }
 
-        event = EventCreate(**event_data)
+        event = _EVENT_CREATE_TA.validate_python(event_data)
         assert not hasattr(event, "extra_field")
 
     def test_type_coercion(self):
@@ -200,7 +216,7 @@ class TestSchemaValidation:
             "resident": "test"
         }
 
-        event = EventCreate(**event_data)
+        event = _EVENT_CREATE_TA.validate_python(event_data)
         # Should be coerced to string
         assert event.value == "123"
         assert isinstance(event.value, str)
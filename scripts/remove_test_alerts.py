@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """
 Script to remove test alerts from MongoDB
+
+Pass --dry-run to list what would be removed without deleting anything.
 """
 import asyncio
 import os
+import re
 import sys
 from pathlib import Path
 
@@ -12,8 +15,15 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.db.mongo import MongoDB
 
-async def remove_test_alerts():
-    """Remove all test alerts from the database"""
+# Most matching alerts listed before deleting, so a large backlog isn't pulled into memory just to print it
+MAX_LISTED_ALERTS = 1000
+# Most 'test alert' messages previewed by --dry-run
+DRY_RUN_PREVIEW_LIMIT = 50
+# Compiled once; pymongo sends it as a BSON regex
+TEST_ALERT_MESSAGE = re.compile(r"test alert", re.IGNORECASE)
+
+async def remove_test_alerts(dry_run: bool = False):
+    """Remove all test alerts from the database (or only list them when dry_run is set)"""
     try:
         # Connect to MongoDB
         await MongoDB.connect()
@@ -22,41 +32,45 @@ async def remove_test_alerts():
         db = MongoDB.client[MongoDB._db_name]
         collection = db["alerts"]
 
-        # Find test alerts before deleting (for logging)
-        test_alerts = await collection.find({"type": "test_alert"}).to_list(None)
+        # Count server-side, then list only the fields we print (capped) rather than every full document
+        test_alert_count = await collection.count_documents({"type": "test_alert"})
 
-        if test_alerts:
-            print(f"Found {len(test_alerts)} test alert(s) to remove:")
+        if test_alert_count:
+            print(f"Found {test_alert_count} test alert(s) to remove:")
+            test_alerts = await collection.find(
+                {"type": "test_alert"}, {"_id": 1, "household_id": 1}
+            ).to_list(length=MAX_LISTED_ALERTS)
             for alert in test_alerts:
                 print(f"  - {alert.get('_id')} from {alert.get('household_id')}")
+            if test_alert_count > len(test_alerts):
+                print(f"  ... and {test_alert_count - len(test_alerts)} more")
 
             # Delete all test alerts
-            result = await collection.delete_many({"type": "test_alert"})
-            print(f"✓ Deleted {result.deleted_count} test alert(s)")
+            if not dry_run:
+                result = await collection.delete_many({"type": "test_alert"})
+                print(f"✓ Deleted {result.deleted_count} test alert(s)")
         else:
             print("No test alerts found in database")
 
-        # Also check for alerts with "test" in the message
-        test_message_alerts = await collection.find(
-            {"message": {"$regex": "test", "$options": "i"}}
-        ).to_list(None)
-
-        if test_message_alerts:
-            print(f"\nFound {len(test_message_alerts)} alert(s) with 'test' in message:")
+        # Alerts with "test alert" in the message: one regex pass, either a capped preview or the delete
+        # itself (deleted_count reports how many matched), rather than a find followed by a delete_many
+        if dry_run:
+            test_message_alerts = await collection.find(
+                {"message": TEST_ALERT_MESSAGE}, {"_id": 1, "message": 1}
+            ).to_list(length=DRY_RUN_PREVIEW_LIMIT)
+            print(f"\nWould delete alert(s) with 'test alert' in message "
+                  f"(showing up to {DRY_RUN_PREVIEW_LIMIT}):")
             for alert in test_message_alerts:
                 print(f"  - {alert.get('_id')}: {alert.get('message')[:50]}")
-
-            # Ask for confirmation before deleting these
-            result = await collection.delete_many(
-                {"message": {"$regex": "test alert", "$options": "i"}}
-            )
+        else:
+            result = await collection.delete_many({"message": TEST_ALERT_MESSAGE})
             print(f"✓ Deleted {result.deleted_count} alert(s) with 'test alert' in message")
 
-        print("\n✓ Cleanup complete")
+        print("\n✓ Dry run complete, nothing deleted" if dry_run else "\n✓ Cleanup complete")
 
     except Exception as e:
         print(f"Error removing test alerts: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(remove_test_alerts())
\ No newline at end of file
+    asyncio.run(remove_test_alerts(dry_run="--dry-run" in sys.argv[1:]))
\ No newline at end of file
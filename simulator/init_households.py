@@ -12,9 +12,43 @@ import os
 # Add parent directory to path to import app modules
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from pymongo.errors import BulkWriteError
+
 from app.db.mongo import MongoDB
 
 
+def build_household_doc(household_id: str, data: dict, now: datetime) -> dict:
+    """Build the households document for one entry of households.json"""
+    # Extract unique residents from events in one pass, keyed by name (insertion order
+    # keeps first-sighting order); the record is only built the first time a name is seen
+    residents_map = {}
+    for event in data.get("events", []):
+        resident_name = event.get("resident")
+        if resident_name and resident_name not in residents_map:
+            residents_map[resident_name] = {
+                "id": f"{household_id}_{resident_name}",
+                "name": resident_name.capitalize(),
+                "age": 75  # Default age, can be updated later
+            }
+
+    # If no residents found, create a generic one
+    residents = list(residents_map.values()) or [{
+        "id": f"{household_id}_resident",
+        "name": "Resident",
+        "age": 75
+    }]
+
+    return {
+        "_id": household_id,
+        "name": data["name"],
+        "residents": residents,
+        "sensors": data.get("events", []),  # Store sensor configuration
+        "status": "active",  # Will be updated to 'inactive' by anomaly detector if no activity
+        "created_at": now,
+        "updated_at": now
+    }
+
+
 async def init_households():
     """Initialize households collection from households.json"""
 
@@ -28,47 +62,28 @@ async def init_households():
     # Connect to MongoDB
     await MongoDB.connect()
 
-    # Insert households using MongoDB.write
-    inserted_count = 0
-    for household_id, data in households_data.items():
-        # Extract unique residents from events
-        residents = []
-        seen_residents = set()
-
-        for event in data.get("events", []):
-            resident_name = event.get("resident")
-            if resident_name and resident_name not in seen_residents:
-                residents.append({
-                    "id": f"{household_id}_{resident_name}",
-                    "name": resident_name.capitalize(),
-                    "age": 75  # Default age, can be updated later
-                })
-                seen_residents.add(resident_name)
-
-        # If no residents found, create a generic one
-        if not residents:
-            residents.append({
-                "id": f"{household_id}_resident",
-                "name": "Resident",
-                "age": 75
-            })
-
-        household_doc = {
-            "_id": household_id,
-            "name": data["name"],
-            "residents": residents,
-            "sensors": data.get("events", []),  # Store sensor configuration
-            "status": "active",  # Will be updated to 'inactive' by anomaly detector if no activity
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-
-        try:
-            await MongoDB.write("households", household_doc)
-            print(f"   ✓ {household_id}: {data['name']} ({len(residents)} residents)")
-            inserted_count += 1
-        except Exception as e:
-            print(f"   ✗ Failed to insert {household_id}: {e}")
+    # Build every document up front and insert them in one unordered insert_many,
+    # instead of a round trip per household
+    now = datetime.utcnow()
+    household_docs = [build_household_doc(household_id, data, now)
+                      for household_id, data in households_data.items()]
+
+    failed = {}
+    try:
+        await MongoDB.write_many("households", household_docs)
+    except BulkWriteError as e:
+        # The rest of the batch was still written; only these documents failed
+        failed = {error["index"]: error.get("errmsg") for error in e.details.get("writeErrors", [])}
+    except Exception as e:
+        failed = {index: e for index in range(len(household_docs))}
+
+    for index, household_doc in enumerate(household_docs):
+        if index in failed:
+            print(f"   ✗ Failed to insert {household_doc['_id']}: {failed[index]}")
+        else:
+            print(f"   ✓ {household_doc['_id']}: {household_doc['name']} "
+                  f"({len(household_doc['residents'])} residents)")
+    inserted_count = len(household_docs) - len(failed)
 
     print(f"\n✅ Inserted {inserted_count} households successfully!")
 